@@ -0,0 +1,169 @@
+# aggregator.py — montagem incremental de candles a partir de ticks
+import pandas as pd
+
+MINUTE_MS = 60_000
+
+def minute_timestamp(minute):
+    """Converte o número do minuto (epoch ms // 60000) em pd.Timestamp UTC."""
+    return pd.Timestamp(minute * MINUTE_MS, unit='ms', tz='UTC')
+
+class MinuteAggregator:
+    """
+    OHLCV corrente de um ativo, atualizado no lugar a cada tick.
+
+    Cada minuto aberto guarda [o, h, l, c, v, ts_open, ts_close]; o open/close
+    usam o timestamp do tick, então ticks levemente fora de ordem dentro do
+    minuto não trocam a abertura/fechamento. Um minuto é fechado quando chega
+    um tick com timestamp `grace_ms` depois do fim dele; ticks de minutos já
+    fechados são descartados e contados em `late_ticks`.
+
+    Com `gap_fill` > 0, minutos sem nenhum tick até `gap_fill` minutos depois
+    do último negociado saem do fechamento como candle flat (o=h=l=c=último
+    fechamento, v=0, "filled": True); parado há mais tempo (mercado fechado),
+    não. O fechamento é a única fonte dos minutos fechados, então um minuto
+    nunca sai duas vezes.
+    """
+    __slots__ = ("grace_ms", "gap_fill", "bars", "closed_through", "late_ticks", "last_minute", "last_close",
+                 "last_traded")
+
+    def __init__(self, grace_ms=0, gap_fill=0):
+        self.grace_ms = grace_ms
+        self.gap_fill = gap_fill
+        self.bars = {}
+        self.closed_through = None  # primeiro minuto ainda aceito
+        self.late_ticks = 0
+        self.last_minute = None  # último minuto fechado (real ou flat)
+        self.last_close = None
+        self.last_traded = None  # último minuto fechado com ticks
+
+    def resume(self, minute, close, last_traded=None):
+        """Continua depois de um histórico já fechado (restart): nada até `minute` é reaberto."""
+        self.closed_through = max(self.closed_through or minute + 1, minute + 1)
+        self.last_minute = minute
+        self.last_close = close
+        self.last_traded = last_traded
+
+    def add_tick(self, ts_ms, price):
+        """Aplica um tick; retorna a lista de candles fechados por ele (normalmente vazia)."""
+        minute = int(ts_ms // MINUTE_MS)
+        if self.closed_through is not None and minute < self.closed_through:
+            self.late_ticks += 1
+            return []
+        bar = self.bars.get(minute)
+        if bar is None:
+            self.bars[minute] = [price, price, price, price, 1, ts_ms, ts_ms]
+        else:
+            if price > bar[1]:
+                bar[1] = price
+            if price < bar[2]:
+                bar[2] = price
+            if ts_ms < bar[5]:
+                bar[0] = price
+                bar[5] = ts_ms
+            if ts_ms >= bar[6]:
+                bar[3] = price
+                bar[6] = ts_ms
+            bar[4] += 1
+        return self.close_until(int((ts_ms - self.grace_ms) // MINUTE_MS))
+
+    def add_bar(self, minute, o, h, l, c, n, ts_open, ts_close):
+        """
+        Aplica n ticks consecutivos do mesmo minuto já resumidos (tick_queue):
+        mesmo efeito de chamar add_tick para cada um deles.
+        """
+        if self.closed_through is not None and minute < self.closed_through:
+            self.late_ticks += n
+            return []
+        bar = self.bars.get(minute)
+        if bar is None:
+            self.bars[minute] = [o, h, l, c, n, ts_open, ts_close]
+        else:
+            if h > bar[1]:
+                bar[1] = h
+            if l < bar[2]:
+                bar[2] = l
+            if ts_open < bar[5]:
+                bar[0] = o
+                bar[5] = ts_open
+            if ts_close >= bar[6]:
+                bar[3] = c
+                bar[6] = ts_close
+            bar[4] += n
+        return self.close_until(int((ts_close - self.grace_ms) // MINUTE_MS))
+
+    def close_until(self, minute):
+        """Fecha e retorna (em ordem) todos os minutos anteriores a `minute`."""
+        if self.closed_through is not None and minute <= self.closed_through:
+            return []
+        self.closed_through = minute
+        closed = []
+        if self.bars and min(self.bars) < minute:
+            for m in sorted(k for k in self.bars if k < minute):
+                self._fill(closed, m)
+                o, h, l, c, v, _, _ = self.bars.pop(m)
+                closed.append({"timestamp": minute_timestamp(m), "o": o, "h": h, "l": l, "c": c, "v": v})
+                self.last_minute = self.last_traded = m
+                self.last_close = c
+        self._fill(closed, minute)
+        return closed
+
+    def _fill(self, closed, until):
+        # candles flat do minuto seguinte ao último fechado até `until` (exclusive)
+        if not self.gap_fill or self.last_traded is None:
+            return
+        c = self.last_close
+        for m in range(self.last_minute + 1, min(until, self.last_traded + self.gap_fill + 1)):
+            closed.append({"timestamp": minute_timestamp(m), "o": c, "h": c, "l": c, "c": c, "v": 0, "filled": True})
+            self.last_minute = m
+
+def timeframe_minutes(tf):
+    """'1m' -> 1, '15m' -> 15, '1h' -> 60."""
+    unit = tf[-1]
+    n = int(tf[:-1])
+    if unit == "m":
+        return n
+    if unit == "h":
+        return n * 60
+    raise ValueError(f"unsupported timeframe: {tf}")
+
+class RollupAggregator:
+    """
+    Monta candles de timeframes maiores (5m/15m/1h...) a partir dos candles de
+    1m fechados de um ativo, um candle por vez. O candle do timeframe fecha no
+    último minuto do período ou, se houver buraco, quando chega um minuto de
+    outro período.
+    """
+
+    def __init__(self, timeframes):
+        self.timeframes = [(tf, timeframe_minutes(tf)) for tf in timeframes]
+        self.bars = {}  # tf -> [bucket, o, h, l, c, v]
+
+    def add(self, candle):
+        """Aplica um candle de 1m; retorna [(tf, candle)] dos períodos fechados."""
+        minute = pd.Timestamp(candle["timestamp"]).value // (MINUTE_MS * 1_000_000)
+        closed = []
+        for tf, size in self.timeframes:
+            bucket = minute - minute % size
+            bar = self.bars.get(tf)
+            if bar is not None and bar[0] != bucket:
+                if bucket > bar[0]:
+                    closed.append((tf, self._emit(bar)))
+                    bar = None
+                else:
+                    continue  # minuto de um período já fechado
+            if bar is None:
+                bar = self.bars[tf] = [bucket, candle["o"], candle["h"], candle["l"], candle["c"], candle["v"]]
+            else:
+                bar[2] = max(bar[2], candle["h"])
+                bar[3] = min(bar[3], candle["l"])
+                bar[4] = candle["c"]
+                bar[5] += candle["v"]
+            if (minute + 1) % size == 0:
+                closed.append((tf, self._emit(bar)))
+                self.bars[tf] = None
+        return closed
+
+    @staticmethod
+    def _emit(bar):
+        bucket, o, h, l, c, v = bar
+        return {"timestamp": minute_timestamp(bucket), "o": o, "h": h, "l": l, "c": c, "v": v}
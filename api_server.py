@@ -1,20 +1,34 @@
 # api_server.py
 import uvicorn
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
 from db import init_db, SessionLocal, Signal
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 import threading
 from data_ingest import connect_and_listen
+from db_writer import writer
+from signal_hub import hub
+from signal_cache import signal_cache, signal_to_dict
+from supervisor import IngestSupervisor
+from notifier import notify_if_needed
+from config import INGEST_WORKERS
+import metrics
 import pandas as pd
+import json
+from candle_store import iter_candles, CANDLE_COLUMNS
+from maintenance import scheduler as maintenance
+from signal_store import page_signals, iter_signals, ndjson_lines, csv_lines
 
 app = FastAPI(title="Valory Scanner API")
 
 init_db()
 
 class SignalOut(BaseModel):
-    id: int
+    id: Optional[int] = None  # sinais ainda na fila do writer não têm id
     timestamp: datetime
     ativo: str
     minuto_entrada: datetime
@@ -23,39 +37,213 @@ class SignalOut(BaseModel):
     probabilidade: float
     detalhes: dict
     expiracao_sugerida_min: int
+    timeframe: Optional[str] = "1m"
 
 @app.get("/signals/current", response_model=List[SignalOut])
-def get_current(top: int = 10):
-    db = SessionLocal()
-    q = db.query(Signal).order_by(Signal.probabilidade.desc()).limit(top).all()
-    return q
+def get_current(top: int = 10, asset: Optional[str] = None, valid: bool = False):
+    cached = signal_cache.top(top, asset=asset, valid_only=valid)
+    if cached is not None:
+        return cached
+    with SessionLocal() as db:
+        q = db.query(Signal)
+        if asset:
+            q = q.filter(Signal.ativo == asset)
+        return [signal_to_dict(r) for r in q.order_by(Signal.probabilidade.desc()).limit(top).all()]
 
 @app.get("/signals/history", response_model=List[SignalOut])
-def get_history(limit: int = 100):
-    db = SessionLocal()
-    q = db.query(Signal).order_by(Signal.timestamp.desc()).limit(limit).all()
-    return q
+def get_history(response: Response, limit: int = Query(100, ge=1, le=5000), asset: Optional[str] = None,
+                tipo: Optional[str] = None, min_confluences: Optional[int] = None,
+                start: Optional[datetime] = None, end: Optional[datetime] = None,
+                cursor: Optional[str] = None, paged: bool = False):
+    """
+    Últimos sinais, mais novo primeiro. Com filtros (tipo, min_confluences,
+    start/end), `cursor` ou `paged=true` a consulta vai ao banco por keyset e o
+    header X-Next-Cursor traz o cursor da próxima página (ausente na última).
+    """
+    filters = dict(asset=asset, tipo=tipo, min_confluences=min_confluences, start=start, end=end, cursor=cursor)
+    if not (paged or cursor or tipo or min_confluences is not None or start or end):
+        cached = signal_cache.history(limit, asset=asset)
+        if cached is not None:
+            return cached
+    try:
+        rows, next_cursor = page_signals(limit, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+@app.get("/signals/export")
+def export_signals(format: str = "ndjson", asset: Optional[str] = None, tipo: Optional[str] = None,
+                   min_confluences: Optional[int] = None, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None):
+    """Todos os sinais do filtro, mais novo primeiro, serializados em partes (NDJSON ou CSV)."""
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    filters = dict(asset=asset, tipo=tipo, min_confluences=min_confluences, start=start, end=end)
+
+    def body():
+        first = True
+        for rows in iter_signals(**filters):
+            yield ndjson_lines(rows) if format == "ndjson" else csv_lines(rows, header=first)
+            first = False
+        if first and format == "csv":
+            yield csv_lines([], header=True)
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    headers = {"Content-Disposition": f"attachment; filename=signals.{format}"}
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
+
+SSE_HEARTBEAT = 15  # segundos
+
+@app.on_event("startup")
+async def attach_hub():
+    hub.attach_loop(asyncio.get_running_loop())
+    signal_cache.load_from_db()
+    # snapshot do stream = o mesmo top de /signals/current, não só o que chegou desde a subida
+    # (sinais vindos do banco têm datetime: vão para o JSON como ISO, igual aos do ingest)
+    hub.snapshot_source = lambda n: jsonable_encoder(signal_cache.top(n))
+    maintenance.start()
+
+@app.get("/signals/stream")
+async def stream_signals(request: Request):
+    """Server-Sent Events: evento `snapshot` com os sinais de maior probabilidade e depois um `signal` por sinal novo."""
+    sub, snapshot = hub.subscribe()
+
+    async def events():
+        try:
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            while not sub.closed:
+                try:
+                    sig = await asyncio.wait_for(sub.get(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: signal\ndata: {json.dumps(sig)}\n\n"
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/ws/signals")
+async def ws_signals(ws: WebSocket):
+    await ws.accept()
+    sub, snapshot = hub.subscribe()
+
+    async def wait_disconnect():
+        # o cliente não manda nada; só precisamos saber quando ele sai
+        while (await ws.receive())["type"] != "websocket.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(wait_disconnect())
+    try:
+        await ws.send_json({"type": "snapshot", "signals": snapshot})
+        while not sub.closed:
+            getter = asyncio.ensure_future(sub.get())
+            done, _ = await asyncio.wait({getter, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if watcher in done:
+                getter.cancel()
+                return
+            await ws.send_json({"type": "signal", "signal": getter.result()})
+        await ws.close(code=1013)  # cliente lento demais: reconectar
+    except WebSocketDisconnect:
+        pass
+    finally:
+        watcher.cancel()
+        hub.unsubscribe(sub)
+
+@app.get("/candles")
+def get_candles(asset: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                columns: Optional[str] = Query(None, description="ex.: o,h,l,c"),
+                limit: Optional[int] = None, format: str = "json"):
+    """Candles de `asset` em [start, end), enviados em partes (JSON array ou NDJSON)."""
+    cols = tuple(c.strip() for c in columns.split(",") if c.strip()) if columns else CANDLE_COLUMNS
+    if set(cols) - set(CANDLE_COLUMNS):
+        raise HTTPException(status_code=400, detail=f"columns must be a subset of {','.join(CANDLE_COLUMNS)}")
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    keys = ("timestamp",) + cols
+
+    def rows_json():
+        for rows in iter_candles(asset, start, end, cols, limit):
+            yield [json.dumps(dict(zip(keys, (r[0].isoformat(),) + tuple(r[1:])))) for r in rows]
+
+    def body():
+        if format == "ndjson":
+            for chunk in rows_json():
+                yield "\n".join(chunk) + "\n"
+            return
+        yield "["
+        first = True
+        for chunk in rows_json():
+            yield ("" if first else ",") + ",".join(chunk)
+            first = False
+        yield "]"
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(body(), media_type=media_type)
 
 _bg_thread = None
+_supervisor = None
+
+def _on_sharded_signal(sig):
+    # sinais vindos dos processos de shard: gravados, notificados e distribuídos aqui
+    writer.submit_signal(sig)
+    notify_if_needed(sig)
+    signal_cache.add(sig)
+    hub.publish(sig)
+
 def _run_ws():
     import asyncio
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     async def on_new_signal(sig):
-        print("New signal:", sig)
+        signal_cache.add(sig)
+        hub.publish(sig)
     loop.run_until_complete(connect_and_listen(on_new_signal))
 
 @app.post("/start")
 def start_scan():
-    global _bg_thread
+    global _bg_thread, _supervisor
+    if INGEST_WORKERS > 1:
+        if _supervisor is None:
+            _supervisor = IngestSupervisor(_on_sharded_signal)
+        if not _supervisor.start():
+            return {"status":"already_running"}
+        return {"status":"started", "shards": len(_supervisor.shards)}
     if _bg_thread and _bg_thread.is_alive():
         return {"status":"already_running"}
     _bg_thread = threading.Thread(target=_run_ws, daemon=True)
     _bg_thread.start()
     return {"status":"started"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Métricas do processo da API (com shards, cada processo de ingestão tem as suas)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/maintenance")
+def maintenance_report():
+    """Relatório da última execução de maintenance.run_maintenance (None antes da primeira)."""
+    return maintenance.last_report
+
+@app.get("/shards")
+def shards_status():
+    return _supervisor.status() if _supervisor else []
+
+@app.on_event("shutdown")
+def flush_writer():
+    maintenance.stop()
+    writer.stop()
+
 @app.post("/stop")
 def stop_scan():
+    if _supervisor and _supervisor.is_running():
+        _supervisor.stop()
+        return {"status":"stopped"}
     return {"status":"stopping_not_implemented"}
 
 if __name__ == "__main__":
@@ -1,34 +1,36 @@
 # backtest.py
 import argparse
+import numpy as np
 import pandas as pd
 import json
-from db import engine
-from signal_engine import evaluate_signal
-from sqlalchemy import text
+from signal_engine import evaluate_signal, evaluate_frame
+from candle_store import load_candles, iter_candles, CANDLE_COLUMNS
+from candle_archive import load_window, iter_window
+from bisect import bisect_left
+from collections import defaultdict
 from datetime import timedelta
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from indicator_cache import IndicatorCache
+from config import INDICATOR_CACHE_MB, STREAM_CHUNK_BARS
 
 LOG = logging.getLogger("backtest")
 LOG.setLevel(logging.INFO)
 
-def load_from_db(asset):
-    sql = text("SELECT timestamp, o, h, l, c, v FROM candles WHERE ativo = :asset ORDER BY timestamp")
-    with engine.connect() as conn:
-        df = pd.read_sql(sql, conn, params={"asset": asset}, parse_dates=["timestamp"])
-    if df.empty:
-        return None
-    df = df.set_index("timestamp")
-    return df
+def load_from_db(asset, start=None, end=None):
+    return load_candles(asset, start=start, end=end)
 
 def load_from_csv(path):
     df = pd.read_csv(path, parse_dates=["timestamp"])
     df = df.set_index("timestamp")
     return df
 
-def simulate(df, asset, expiration_min=2):
-    results = []
+def simulate(df, asset, expiration_min=2, vectorized=True, min_history=50, cache=None):
     df = df.sort_index()
-    min_history = 50
+    if vectorized:
+        return simulate_vectorized(df, asset, expiration_min=expiration_min, min_history=min_history, cache=cache)
+    results = []
     for i in range(min_history, len(df)-expiration_min):
         window = df.iloc[:i+1]
         signal = evaluate_signal(window, asset)
@@ -54,22 +56,142 @@ def simulate(df, asset, expiration_min=2):
         })
     return results
 
-def run_backtest(assets, csv_map=None, expiration_min=2, out_csv="backtest_results.csv"):
+def simulate_vectorized(df, asset, expiration_min=2, min_history=50, cache=None):
+    """
+    Mesmo resultado de simulate(vectorized=False), mas calcula indicadores e
+    sinais de todas as barras numa única passada (evaluate_frame) e mede o
+    resultado com arrays deslocados, em vez de chamar evaluate_signal por barra.
+    `cache` (IndicatorCache) reaproveita as séries dos indicadores de execuções anteriores.
+    """
+    n = len(df)
+    if n - expiration_min <= min_history:
+        return []
+    sig = evaluate_frame(df, cache=cache, asset=asset)
+    close = df['c'].to_numpy(dtype=float)
+    price_out = np.full(n, np.nan)
+    price_out[:n-expiration_min] = close[expiration_min:]
+    direction = np.where(sig['tipo'].to_numpy() == 'CALL', price_out > close, price_out < close).astype(int)
+
+    rows = np.flatnonzero(sig['tipo'].notna().to_numpy())
+    rows = rows[(rows >= min_history) & (rows < n-expiration_min)]
+    entry = df.index[rows] + pd.Timedelta(minutes=1)
+    tipos = sig['tipo'].to_numpy()[rows]
+    confl = sig['confluencias'].to_numpy()[rows]
+    probs = sig['probability'].to_numpy()[rows]
+    return [{
+        "timestamp": entry[j].isoformat(),
+        "asset": asset,
+        "tipo": tipos[j],
+        "confluencias": int(confl[j]),
+        "probability": round(float(probs[j]), 2),
+        "result": int(direction[i])
+    } for j, i in enumerate(rows)]
+
+WARMUP_BARS = 500  # barras extras antes de cada pedaço: EMA21 converge e RSI/BB/S-R ficam completos
+
+def _shared_candles(df):
+    """Copia timestamps + OHLCV para um bloco de shared memory: (shm, n, tz)."""
+    n = len(df)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, n * 8 * 6))
+    buf = np.ndarray((6, n), dtype=np.float64, buffer=shm.buf)
+    buf[0].view(np.int64)[:] = df.index.as_unit("ns").asi8
+    for k, col in enumerate(("o", "h", "l", "c", "v"), start=1):
+        buf[k] = df[col].to_numpy(dtype=np.float64) if col in df else 0.0
+    return shm, n, str(df.index.tz) if df.index.tz is not None else None
+
+def _simulate_shared(task):
+    """Worker: anexa ao bloco compartilhado e simula as barras [lo, hi) de um ativo."""
+    shm_name, n, tz, asset, lo, hi, expiration_min, vectorized, cache_dir, cache_bytes = task
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        buf = np.ndarray((6, n), dtype=np.float64, buffer=shm.buf)
+        s = max(0, lo - WARMUP_BARS)
+        e = min(n, hi + expiration_min)
+        index = pd.DatetimeIndex(buf[0, s:e].view(np.int64).copy().view("datetime64[ns]"), name="timestamp")
+        index = index.tz_localize("UTC").tz_convert(tz) if tz else index
+        df = pd.DataFrame({col: buf[k, s:e].copy() for k, col in enumerate(("o", "h", "l", "c", "v"), start=1)},
+                          index=index)
+        del buf
+    finally:
+        shm.close()
+    cache = IndicatorCache(cache_dir, cache_bytes) if cache_dir else None
+    return simulate(df, asset, expiration_min=expiration_min, vectorized=vectorized, min_history=lo - s, cache=cache)
+
+def _chunk_bounds(n, chunks, expiration_min, min_history=50):
+    """Divide as barras simuláveis [min_history, n-expiration) em `chunks` pedaços contíguos."""
+    last = n - expiration_min
+    if last <= min_history:
+        return []
+    edges = np.linspace(min_history, last, max(1, chunks) + 1).astype(int)
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+
+def _simulate_parallel(frames, expiration_min, vectorized, workers, chunks, cache_dir=None, cache_bytes=None):
+    """Distribui (ativo, pedaço) num pool de processos; o resultado segue a ordem de `frames`."""
+    blocks, tasks = [], []
+    try:
+        for asset, df in frames:
+            shm, n, tz = _shared_candles(df.sort_index())
+            blocks.append(shm)
+            for lo, hi in _chunk_bounds(n, chunks, expiration_min):
+                tasks.append((shm.name, n, tz, asset, lo, hi, expiration_min, vectorized, cache_dir, cache_bytes))
+        results = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for res in pool.map(_simulate_shared, tasks):
+                results.extend(res)
+        return results
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+def load_asset(asset, csv_map=None, start=None, end=None, archive=None):
+    if csv_map and asset in csv_map:
+        return load_from_csv(csv_map[asset])
+    if archive:
+        return load_window(archive, asset, start=start, end=end)
+    return load_from_db(asset, start=start, end=end)
+
+def run_backtest(assets, csv_map=None, expiration_min=2, out_csv="backtest_results.csv", vectorized=True, start=None, end=None,
+                 workers=1, chunks=1, archive=None, cache_dir=None, cache_mb=INDICATOR_CACHE_MB,
+                 stream=False, chunk_size=STREAM_CHUNK_BARS):
+    """
+    Roda o backtest dos ativos e grava CSV + calibration.json.
+    Com workers > 1 os ativos (e, com chunks > 1, pedaços de cada ativo com
+    WARMUP_BARS de sobreposição) são simulados num pool de processos; os
+    candles vão por shared memory e o resultado é juntado na ordem dos ativos.
+    Com `cache_dir`, as séries dos indicadores ficam num IndicatorCache em
+    disco (até `cache_mb` MB) e são reaproveitadas enquanto os candles forem os mesmos.
+    Com `stream`, ver run_backtest_stream (memória limitada, sem paralelismo).
+    """
+    cache_bytes = int(cache_mb * 1024 * 1024)
+    cache = IndicatorCache(cache_dir, cache_bytes) if cache_dir else None
+    if stream:
+        if workers > 1:
+            LOG.info("Streaming backtest runs in a single process; ignoring --workers")
+        return run_backtest_stream(assets, csv_map, expiration_min, out_csv, vectorized, start, end, archive,
+                                   chunk_size, cache)
     all_results = []
+    frames = []
     for asset in assets:
-        if csv_map and asset in csv_map:
-            df = load_from_csv(csv_map[asset])
-        else:
-            df = load_from_db(asset)
+        df = load_asset(asset, csv_map, start, end, archive)
         if df is None or df.empty:
             LOG.warning(f"No data for {asset}")
             continue
-        res = simulate(df, asset, expiration_min=expiration_min)
+        if workers > 1:
+            frames.append((asset, df))
+            continue
+        res = simulate(df, asset, expiration_min=expiration_min, vectorized=vectorized, cache=cache)
         all_results.extend(res)
+    if frames:
+        all_results = _simulate_parallel(frames, expiration_min, vectorized, workers, chunks, cache_dir, cache_bytes)
+    if cache is not None and (cache.hits or cache.misses):
+        LOG.info(f"Indicator cache: {cache.hits} hits, {cache.misses} misses")
     if not all_results:
         LOG.info("No signals found in backtest")
         return None
-    dfres = pd.DataFrame(all_results)
+    return write_reports(pd.DataFrame(all_results), out_csv)
+
+def write_reports(dfres, out_csv):
     dfres.to_csv(out_csv, index=False)
     LOG.info(f"Backtest saved to {out_csv}")
     report = {}
@@ -79,15 +201,115 @@ def run_backtest(assets, csv_map=None, expiration_min=2, out_csv="backtest_resul
             "count": len(g),
             "win_rate": float(g['result'].mean() * 100)
         }
-    dfres['prob_bucket'] = (pd.cut(dfres['probability'], bins=[0,50,60,70,80,90,100], labels=["<50","50-60","60-70","70-80","80-90","90-100"]))
+    dfres['prob_bucket'] = (pd.cut(dfres['probability'], bins=PROB_BINS, labels=PROB_LABELS))
     pb = dfres.groupby('prob_bucket')['result'].agg(['count','mean']).reset_index()
     pb['win_rate'] = pb['mean']*100
     out = {"by_confluences": report, "by_prob_bucket": pb.to_dict(orient='records')}
-    cal_path = "calibration.json"
+    _write_calibration(out)
+    return dfres, out
+
+PROB_BINS = [0, 50, 60, 70, 80, 90, 100]
+PROB_LABELS = ["<50", "50-60", "60-70", "70-80", "80-90", "90-100"]
+
+def _write_calibration(out, cal_path="calibration.json"):
     with open(cal_path, "w") as f:
         json.dump(out, f, indent=2, default=str)
     LOG.info(f"Calibration saved to {cal_path}")
-    return dfres, out
+
+class CalibrationStats:
+    """by_confluences / by_prob_bucket de write_reports acumulados resultado a resultado, sem guardar as linhas."""
+
+    def __init__(self):
+        self.by_confluences = defaultdict(lambda: [0, 0])  # confluencias -> [count, wins]
+        self.by_bucket = defaultdict(lambda: [0, 0])       # rótulo de PROB_LABELS -> [count, wins]
+        self.count = 0
+
+    def add(self, results):
+        for r in results:
+            win = int(r['result'])
+            stats = self.by_confluences[int(r['confluencias'])]
+            stats[0] += 1
+            stats[1] += win
+            # mesmos intervalos (a, b] do pd.cut de write_reports
+            i = bisect_left(PROB_BINS, r['probability'])
+            if 0 < i < len(PROB_BINS):
+                stats = self.by_bucket[PROB_LABELS[i - 1]]
+                stats[0] += 1
+                stats[1] += win
+        self.count += len(results)
+
+    def to_dict(self):
+        report = {k: {"count": n, "win_rate": wins / n * 100} for k, (n, wins) in sorted(self.by_confluences.items())}
+        buckets = [{"prob_bucket": label, "count": self.by_bucket[label][0],
+                    "mean": self.by_bucket[label][1] / self.by_bucket[label][0],
+                    "win_rate": self.by_bucket[label][1] / self.by_bucket[label][0] * 100}
+                   for label in PROB_LABELS if self.by_bucket.get(label, (0,))[0]]
+        return {"by_confluences": report, "by_prob_bucket": buckets}
+
+def iter_asset_frames(asset, csv_map=None, start=None, end=None, archive=None, chunk_size=STREAM_CHUNK_BARS):
+    """Candles de um ativo em DataFrames de até `chunk_size` linhas (um dia por vez no arquivo colunar)."""
+    if csv_map and asset in csv_map:
+        for chunk in pd.read_csv(csv_map[asset], parse_dates=["timestamp"], chunksize=chunk_size):
+            yield chunk.set_index("timestamp")
+    elif archive:
+        yield from iter_window(archive, asset, start=start, end=end)
+    else:
+        for rows in iter_candles(asset, start=start, end=end, chunk_size=chunk_size):
+            yield pd.DataFrame.from_records(rows, columns=["timestamp", *CANDLE_COLUMNS]).set_index("timestamp")
+
+def simulate_stream(frames, asset, expiration_min=2, vectorized=True, min_history=50, cache=None):
+    """
+    simulate() sobre uma sequência de DataFrames em ordem cronológica. Entre um
+    pedaço e outro ficam WARMUP_BARS + expiration_min barras: o aquecimento dos
+    indicadores e as últimas barras, que só podem ser medidas quando o próximo
+    pedaço trouxer o preço de saída. Gera uma lista de resultados por pedaço.
+    """
+    tail = None
+    seen = 0      # barras já lidas (posição global do fim de `tail`)
+    sim_to = 0    # barras [0, sim_to) já simuladas
+    for chunk in frames:
+        if chunk is None or chunk.empty:
+            continue
+        df = chunk.sort_index() if tail is None else pd.concat([tail, chunk.sort_index()])
+        start = seen - (0 if tail is None else len(tail))  # posição global da 1ª linha de df
+        seen += len(chunk)
+        lo = max(sim_to, min_history) - start
+        if len(df) - expiration_min > lo:
+            yield simulate(df, asset, expiration_min=expiration_min, vectorized=vectorized, min_history=lo, cache=cache)
+            sim_to = seen - expiration_min
+        tail = df.iloc[-(WARMUP_BARS + expiration_min):]
+
+def run_backtest_stream(assets, csv_map=None, expiration_min=2, out_csv="backtest_results.csv", vectorized=True,
+                        start=None, end=None, archive=None, chunk_size=STREAM_CHUNK_BARS, cache=None):
+    """
+    Backtest com memória limitada: lê os candles em pedaços de `chunk_size`,
+    grava os resultados no CSV à medida que saem e acumula a calibração em
+    CalibrationStats. Retorna (None, calibração); o CSV/JSON gerados são os
+    mesmos de run_backtest.
+    """
+    stats = CalibrationStats()
+    header = True
+    with open(out_csv, "w", newline="") as f:
+        for asset in assets:
+            before = stats.count
+            frames = iter_asset_frames(asset, csv_map, start, end, archive, chunk_size)
+            for res in simulate_stream(frames, asset, expiration_min, vectorized, cache=cache):
+                if not res:
+                    continue
+                pd.DataFrame(res).to_csv(f, header=header, index=False)
+                header = False
+                stats.add(res)
+            if stats.count == before:
+                LOG.warning(f"No signals for {asset}")
+    if cache is not None and (cache.hits or cache.misses):
+        LOG.info(f"Indicator cache: {cache.hits} hits, {cache.misses} misses")
+    if not stats.count:
+        LOG.info("No signals found in backtest")
+        return None
+    LOG.info(f"Backtest saved to {out_csv} ({stats.count} signals)")
+    out = stats.to_dict()
+    _write_calibration(out)
+    return None, out
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -95,8 +317,21 @@ if __name__ == "__main__":
     parser.add_argument("--csv_map", help="optional mapping JSON file with asset->csvpath", default=None)
     parser.add_argument("--expiration", type=int, default=2)
     parser.add_argument("--out", default="backtest_results.csv")
+    parser.add_argument("--start", default=None, help="first candle timestamp (inclusive) when loading from the DB")
+    parser.add_argument("--end", default=None, help="last candle timestamp (exclusive) when loading from the DB")
+    parser.add_argument("--archive", default=None, help="load candles from a candle_archive directory instead of the DB")
+    parser.add_argument("--workers", type=int, default=1, help="processes for parallel simulation")
+    parser.add_argument("--chunks", type=int, default=1, help="date chunks per asset when --workers > 1")
+    parser.add_argument("--cache", default=None, help="directory for the on-disk indicator cache (reused across runs)")
+    parser.add_argument("--cache-mb", type=float, default=INDICATOR_CACHE_MB, help="size limit of the indicator cache")
+    parser.add_argument("--stream", action="store_true", help="read candles in chunks and write results incrementally (bounded memory)")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_BARS, help="candles per chunk with --stream")
+    parser.add_argument("--slow", action="store_true", help="replay bar-by-bar with evaluate_signal instead of the vectorized path")
     args = parser.parse_args()
     csv_map = None
     if args.csv_map:
         csv_map = json.load(open(args.csv_map))
-    run_backtest(args.assets, csv_map=csv_map, expiration_min=args.expiration, out_csv=args.out)
+    run_backtest(args.assets, csv_map=csv_map, expiration_min=args.expiration, out_csv=args.out, vectorized=not args.slow,
+                 start=args.start, end=args.end, workers=args.workers, chunks=args.chunks,
+                 archive=args.archive, cache_dir=args.cache, cache_mb=args.cache_mb,
+                 stream=args.stream, chunk_size=args.chunk_size)
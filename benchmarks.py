@@ -0,0 +1,271 @@
+# benchmarks.py — benchmarks reprodutíveis dos caminhos quentes com dados sintéticos
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+LOG = logging.getLogger("benchmarks")
+LOG.setLevel(logging.INFO)
+
+SIZES = {
+    "quick": {"series": [1_000, 10_000], "window": [200, 1_000], "minutes": [60], "backtest": [5_000], "batch": [8, 64]},
+    "full": {"series": [1_000, 10_000, 100_000], "window": [200, 1_000, 5_000], "minutes": [60, 600],
+             "backtest": [10_000, 100_000], "batch": [8, 64, 512]},
+}
+
+# --- dados sintéticos ---
+
+def synthetic_ticks(assets=("EURUSD",), minutes=60, ticks_per_minute=60, volatility=0.0005, seed=42,
+                    start="2024-01-01"):
+    """
+    (símbolo, ts_ms, preço) em ordem de tempo: passeio aleatório log-normal por
+    ativo, `ticks_per_minute` ticks por minuto em instantes aleatórios.
+    """
+    rng = np.random.default_rng(seed)
+    t0 = pd.Timestamp(start, tz="UTC").value // 1_000_000
+    n = minutes * ticks_per_minute
+    parts = []
+    for k, asset in enumerate(assets):
+        offsets = np.sort(rng.uniform(0, minutes * 60_000, n))
+        steps = rng.normal(0, volatility / np.sqrt(ticks_per_minute), n)
+        prices = (1.0 + k) * np.exp(np.cumsum(steps))
+        parts.append(pd.DataFrame({"symbol": asset, "ts_ms": t0 + offsets, "price": prices}))
+    ticks = pd.concat(parts).sort_values("ts_ms", kind="stable")
+    return list(ticks.itertuples(index=False, name=None))
+
+def synthetic_candles(n=10_000, volatility=0.0005, seed=42, start="2024-01-01", base=1.0):
+    """DataFrame OHLCV de 1m (índice timestamp), no formato de backtest.load_from_csv."""
+    rng = np.random.default_rng(seed)
+    c = base * np.exp(np.cumsum(rng.normal(0, volatility, n)))
+    o = np.r_[base, c[:-1]]
+    wick = np.abs(rng.normal(0, volatility * base, (2, n)))
+    h = np.maximum(o, c) + wick[0]
+    l = np.minimum(o, c) - wick[1]
+    v = rng.integers(1, 120, n).astype(float)
+    index = pd.date_range(start, periods=n, freq="min", name="timestamp")
+    return pd.DataFrame({"o": o, "h": h, "l": l, "c": c, "v": v}, index=index)
+
+def as_payload(symbol, ts_ms, price):
+    """Tick no formato do socket.io da Valory (o que handle_real_valory_payload recebe)."""
+    return ["message", {"event": "symbol.price.update", "channel": f"symbol-prices:{symbol}",
+                        "data": {"symbol": symbol, "price": price, "timestamp": ts_ms}}]
+
+# --- medição ---
+
+def _summary(latencies_ns, items, elapsed, peak_bytes):
+    lat = np.asarray(latencies_ns, dtype=float) / 1000.0
+    pct = lambda q: round(float(np.percentile(lat, q)), 3)
+    return {
+        "calls": int(len(lat)),
+        "items": int(items),
+        "throughput_per_s": round(items / elapsed, 1) if elapsed > 0 else None,
+        "latency_us": {"p50": pct(50), "p95": pct(95), "p99": pct(99), "max": round(float(lat.max()), 3)},
+        "peak_mem_kb": round(peak_bytes / 1024, 1),
+    }
+
+def measure(fn, calls, items_per_call=1, repeat=1):
+    """
+    Chama fn(i) para i em range(calls), `repeat` vezes: latência por chamada
+    e vazão da melhor rodada; pico de memória numa rodada extra com tracemalloc
+    (fora da medição de tempo, que o tracemalloc distorce).
+    """
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        lat = np.empty(calls, dtype=np.int64)
+        t_start = time.perf_counter()
+        for i in range(calls):
+            t0 = time.perf_counter_ns()
+            fn(i)
+            lat[i] = time.perf_counter_ns() - t0
+        elapsed = time.perf_counter() - t_start
+        if best is None or elapsed < best[1]:
+            best = (lat, elapsed)
+    gc.collect()
+    tracemalloc.start()
+    fn(0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return _summary(best[0], calls * items_per_call, best[1], peak)
+
+# --- benchmarks ---
+
+def bench_indicators(sizes, seed):
+    from indicators import ema, rsi, bollinger_bands, IndicatorState
+    out = {}
+    for n in sizes["series"]:
+        close = synthetic_candles(n, seed=seed)["c"]
+        out[f"indicators.ema/{n}"] = measure(lambda i: ema(close, 21), 20, n, repeat=3)
+        out[f"indicators.rsi/{n}"] = measure(lambda i: rsi(close, 14), 20, n, repeat=3)
+        out[f"indicators.bollinger_bands/{n}"] = measure(lambda i: bollinger_bands(close, 20, 2), 20, n, repeat=3)
+    candles = synthetic_candles(max(sizes["series"]), seed=seed).reset_index().to_dict("records")
+    state = IndicatorState()
+    out[f"indicators.IndicatorState.update/{len(candles)}"] = measure(lambda i: state.update(candles[i]), len(candles))
+    return out
+
+def bench_signal_engine(sizes, seed):
+    from signal_engine import evaluate_signal, evaluate_state, evaluate_arrays, evaluate_batch
+    from indicators import IndicatorState
+    out = {}
+    for n in sizes["window"]:
+        df = synthetic_candles(n, seed=seed)
+        out[f"signal_engine.evaluate_signal/{n}"] = measure(lambda i: evaluate_signal(df, "BENCH"), 50, repeat=3)
+        ts = df.index.as_unit("ns").asi8
+        o, h, l, c, v = (df[k].to_numpy() for k in ("o", "h", "l", "c", "v"))
+        out[f"signal_engine.evaluate_arrays/{n}"] = measure(
+            lambda i: evaluate_arrays("BENCH", ts, o, h, l, c, v), 200, repeat=3)
+    state = IndicatorState()
+    for rec in synthetic_candles(500, seed=seed).reset_index().to_dict("records"):
+        state.update(rec)
+    out["signal_engine.evaluate_state"] = measure(lambda i: evaluate_state(state, "BENCH"), 2_000, repeat=3)
+    for n_assets in sizes["batch"]:
+        cols = [synthetic_candles(500, seed=seed + k) for k in range(n_assets)]
+        arrays = [np.vstack([d[k].to_numpy() for d in cols]) for k in ("o", "h", "l", "c", "v")]
+        ts = np.array([d.index[-1].value for d in cols])
+        assets = [f"A{k}" for k in range(n_assets)]
+        out[f"signal_engine.evaluate_batch/{n_assets}"] = measure(
+            lambda i: evaluate_batch(assets, ts, *arrays), 50, n_assets, repeat=3)
+    return out
+
+def bench_ingest(sizes, seed, assets, ticks_per_minute, volatility):
+    import data_ingest
+    import notifier
+    from db_writer import writer
+    writer.enabled = False
+    notifier.dispatcher.destinations = []
+    out = {}
+
+    async def noop(signal):
+        pass
+
+    for minutes in sizes["minutes"]:
+        ticks = synthetic_ticks(assets, minutes, ticks_per_minute, volatility, seed)
+        payloads = [as_payload(*t) for t in ticks]
+        for name, calls in (("try_build_candle", ticks), ("handle_real_valory_payload", payloads)):
+            for d in (data_ingest.aggregators, data_ingest.candles_buf, data_ingest.rollups,
+                      data_ingest.rollup_buf, data_ingest.indicator_states):
+                d.clear()
+            lat = np.empty(len(calls), dtype=np.int64)
+
+            async def run():
+                loop_start = time.perf_counter()
+                for i, item in enumerate(calls):
+                    t0 = time.perf_counter_ns()
+                    if name == "try_build_candle":
+                        await data_ingest.try_build_candle(item[0], item[1], item[2], noop)
+                    else:
+                        await data_ingest.handle_real_valory_payload(item, noop)
+                    lat[i] = time.perf_counter_ns() - t0
+                await data_ingest.drain_queues()
+                await data_ingest.flush_batch(noop)
+                data_ingest.stop_queue_workers()
+                return time.perf_counter() - loop_start
+
+            gc.collect()
+            tracemalloc.start()
+            elapsed = asyncio.run(run())
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            # com tracemalloc ligado o tempo fica inflado: mede de novo sem ele
+            for d in (data_ingest.aggregators, data_ingest.candles_buf, data_ingest.rollups,
+                      data_ingest.rollup_buf, data_ingest.indicator_states):
+                d.clear()
+            elapsed = asyncio.run(run())
+            out[f"data_ingest.{name}/{len(assets)}x{minutes}m"] = _summary(lat, len(calls), elapsed, peak)
+    return out
+
+def bench_backtest(sizes, seed):
+    from backtest import simulate
+    out = {}
+    for n in sizes["backtest"]:
+        df = synthetic_candles(n, seed=seed)
+        out[f"backtest.simulate/{n}"] = measure(lambda i: simulate(df, "BENCH"), 3, n)
+    return out
+
+BENCHMARKS = {
+    "indicators": lambda a: bench_indicators(a.sizes, a.seed),
+    "signal_engine": lambda a: bench_signal_engine(a.sizes, a.seed),
+    "ingest": lambda a: bench_ingest(a.sizes, a.seed, a.assets, a.ticks_per_minute, a.volatility),
+    "backtest": lambda a: bench_backtest(a.sizes, a.seed),
+}
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception:
+        return None
+
+def run(args):
+    meta = {
+        "timestamp": pd.Timestamp.now("UTC").isoformat(), "commit": _git_commit(), "python": platform.python_version(),
+        "numpy": np.__version__, "pandas": pd.__version__, "machine": platform.machine(),
+        "seed": args.seed, "profile": args.profile, "assets": list(args.assets),
+        "ticks_per_minute": args.ticks_per_minute, "volatility": args.volatility,
+    }
+    results = {}
+    for name in args.only or BENCHMARKS:
+        LOG.info(f"Running {name} benchmarks")
+        results.update(BENCHMARKS[name](args))
+    return {"meta": meta, "results": results}
+
+def compare(current, baseline, threshold=0.2):
+    """
+    Lista de regressões: p50 de latência maior ou vazão menor que a do baseline
+    por mais de `threshold` (fração). Benchmarks ausentes em um dos lados são ignorados.
+    """
+    regressions = []
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        b_p50, c_p50 = base["latency_us"]["p50"], cur["latency_us"]["p50"]
+        if b_p50 and c_p50 > b_p50 * (1 + threshold):
+            regressions.append({"benchmark": name, "metric": "latency_us.p50", "baseline": b_p50, "current": c_p50,
+                                "change": round(c_p50 / b_p50 - 1, 3)})
+        b_tp, c_tp = base.get("throughput_per_s"), cur.get("throughput_per_s")
+        if b_tp and c_tp is not None and c_tp < b_tp * (1 - threshold):
+            regressions.append({"benchmark": name, "metric": "throughput_per_s", "baseline": b_tp, "current": c_tp,
+                                "change": round(c_tp / b_tp - 1, 3)})
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the indicator/signal/ingest/backtest hot paths")
+    parser.add_argument("--profile", choices=sorted(SIZES), default="quick", help="data sizes to run")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), default=None)
+    parser.add_argument("--assets", nargs="+", default=["EURUSD", "BTCUSDT", "USDJPY", "ETHUSDT"])
+    parser.add_argument("--ticks-per-minute", type=int, default=60)
+    parser.add_argument("--volatility", type=float, default=0.0005, help="std of log returns per minute")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="baseline JSON from an earlier run; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before flagging (0.2 = 20%%)")
+    args = parser.parse_args()
+    args.sizes = SIZES[args.profile]
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("data_ingest").setLevel(logging.WARNING)
+    report = run(args)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    LOG.info(f"Results saved to {args.out}")
+    for name, r in report["results"].items():
+        print(f"{name:55s} p50 {r['latency_us']['p50']:>12.1f}us  p99 {r['latency_us']['p99']:>12.1f}us  "
+              f"{r['throughput_per_s'] or 0:>14.1f}/s  peak {r['peak_mem_kb']:>10.1f}KB")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['benchmark']} {r['metric']}: {r['baseline']} -> {r['current']} ({r['change']:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
@@ -0,0 +1,150 @@
+# candle_archive.py — arquivo colunar (NumPy .npy por coluna, por ativo/dia) para backtests
+import argparse
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+from candle_store import load_candles, to_db_time
+
+LOG = logging.getLogger("candle_archive")
+LOG.setLevel(logging.INFO)
+
+COLUMNS = ("o", "h", "l", "c", "v")
+INDEX_FILE = "index.json"
+
+# Layout:
+#   <root>/index.json                      {ativo: {dia: {"rows", "start", "end"}}}
+#   <root>/<ativo>/<AAAA-MM-DD>/timestamp.npy   int64 (ns, UTC naive)
+#   <root>/<ativo>/<AAAA-MM-DD>/<col>.npy       float64, uma por coluna OHLCV
+
+def read_index(root):
+    path = os.path.join(root, INDEX_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def _write_index(root, index):
+    path = os.path.join(root, INDEX_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+def _day_dir(root, asset, day):
+    return os.path.join(root, asset, day)
+
+def _save_array(path, arr):
+    tmp = path + ".tmp.npy"
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+def _naive_utc_index(index):
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    return index.as_unit("ns")
+
+def export_frame(df, asset, root):
+    """
+    Grava um DataFrame OHLCV (índice timestamp) no arquivo, separado por dia.
+    Dias que já existem são mesclados (o timestamp mais novo vence).
+    Retorna o número de dias gravados.
+    """
+    if df is None or df.empty:
+        return 0
+    df = df.copy()
+    df.index = _naive_utc_index(df.index)
+    df = df[~df.index.duplicated(keep="last")].sort_index()
+    index = read_index(root)
+    days = index.setdefault(asset, {})
+    written = 0
+    for day, part in df.groupby(df.index.floor("D")):
+        key = day.strftime("%Y-%m-%d")
+        if key in days:
+            old = load_day(root, asset, key)
+            part = pd.concat([old, part])
+            part = part[~part.index.duplicated(keep="last")].sort_index()
+        ddir = _day_dir(root, asset, key)
+        os.makedirs(ddir, exist_ok=True)
+        _save_array(os.path.join(ddir, "timestamp.npy"), part.index.asi8)
+        for col in COLUMNS:
+            values = part[col].to_numpy(dtype=np.float64) if col in part else np.zeros(len(part))
+            _save_array(os.path.join(ddir, f"{col}.npy"), values)
+        days[key] = {"rows": len(part), "start": part.index[0].isoformat(), "end": part.index[-1].isoformat()}
+        written += 1
+    _write_index(root, index)
+    return written
+
+def load_day(root, asset, day, columns=COLUMNS):
+    ddir = _day_dir(root, asset, day)
+    ts = np.load(os.path.join(ddir, "timestamp.npy"))
+    data = {col: np.load(os.path.join(ddir, f"{col}.npy")) for col in columns}
+    return pd.DataFrame(data, index=pd.DatetimeIndex(ts.view("datetime64[ns]"), name="timestamp"))
+
+def load_window(root, asset, start=None, end=None, columns=COLUMNS):
+    """
+    Candles de `asset` em [start, end). Só os dias do intervalo são abertos,
+    via memmap, e só as linhas da janela são copiadas para o DataFrame.
+    """
+    parts = list(iter_window(root, asset, start, end, columns))
+    if not parts:
+        return None
+    return pd.concat(parts)
+
+def iter_window(root, asset, start=None, end=None, columns=COLUMNS):
+    """Como load_window, mas gera um DataFrame por dia (memória limitada a um dia)."""
+    days = sorted(read_index(root).get(asset, {}))
+    start = to_db_time(start)
+    end = to_db_time(end)
+    start_ns = pd.Timestamp(start).value if start is not None else None
+    end_ns = pd.Timestamp(end).value if end is not None else None
+    if start is not None:
+        days = [d for d in days if d >= start.strftime("%Y-%m-%d")]
+    if end is not None:
+        days = [d for d in days if d <= end.strftime("%Y-%m-%d")]
+    for day in days:
+        ddir = _day_dir(root, asset, day)
+        ts = np.load(os.path.join(ddir, "timestamp.npy"), mmap_mode="r")
+        lo = 0 if start_ns is None else int(np.searchsorted(ts, start_ns, side="left"))
+        hi = len(ts) if end_ns is None else int(np.searchsorted(ts, end_ns, side="left"))
+        if hi <= lo:
+            continue
+        index = pd.DatetimeIndex(np.array(ts[lo:hi]).view("datetime64[ns]"), name="timestamp")
+        yield pd.DataFrame({col: np.array(np.load(os.path.join(ddir, f"{col}.npy"), mmap_mode="r")[lo:hi])
+                            for col in columns}, index=index)
+
+def export_from_db(assets, root, start=None, end=None):
+    """Exporta candles do SQLite para o arquivo, ativo por ativo."""
+    for asset in assets:
+        df = load_candles(asset, start=start, end=end)
+        days = export_frame(df, asset, root)
+        LOG.info(f"{asset}: {days} days exported to {root}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_exp = sub.add_parser("export", help="export candles from the DB (or CSV files) into the archive")
+    p_exp.add_argument("--root", required=True)
+    p_exp.add_argument("--assets", nargs="+", required=True)
+    p_exp.add_argument("--csv_map", default=None, help="optional mapping JSON file with asset->csvpath")
+    p_exp.add_argument("--start", default=None)
+    p_exp.add_argument("--end", default=None)
+    p_ls = sub.add_parser("list", help="show the archived ranges per asset")
+    p_ls.add_argument("--root", required=True)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.cmd == "export":
+        if args.csv_map:
+            csv_map = json.load(open(args.csv_map))
+            for asset in args.assets:
+                df = pd.read_csv(csv_map[asset], parse_dates=["timestamp"]).set_index("timestamp")
+                LOG.info(f"{asset}: {export_frame(df, asset, args.root)} days exported to {args.root}")
+        else:
+            export_from_db(args.assets, args.root, start=args.start, end=args.end)
+    else:
+        for asset, days in sorted(read_index(args.root).items()):
+            keys = sorted(days)
+            rows = sum(d["rows"] for d in days.values())
+            print(f"{asset}: {len(keys)} days, {rows} rows, {days[keys[0]]['start']} -> {days[keys[-1]]['end']}" if keys else f"{asset}: empty")
@@ -0,0 +1,86 @@
+# candle_ring.py — histórico de candles por ativo em buffer circular NumPy
+import numpy as np
+import pandas as pd
+
+CANDLE_DTYPE = np.dtype([("timestamp", "<i8"), ("o", "<f8"), ("h", "<f8"),
+                         ("l", "<f8"), ("c", "<f8"), ("v", "<f8")])
+
+class CandleRing:
+    """
+    Últimos `capacity` candles de um ativo num array estruturado pré-alocado
+    (timestamp em ns UTC, o, h, l, c, v). Cada candle é gravado duas vezes
+    (posição i e i+capacity), então as últimas N barras são sempre uma fatia
+    contígua: `last(n)` e `column(...)` devolvem views, sem cópia.
+    """
+    __slots__ = ("capacity", "_buf", "_next", "count")
+
+    def __init__(self, capacity=2000):
+        self.capacity = capacity
+        self._buf = np.zeros(2 * capacity, dtype=CANDLE_DTYPE)
+        self._next = 0   # posição (mod capacity) do próximo candle
+        self.count = 0   # candles válidos (<= capacity)
+
+    def __len__(self):
+        return self.count
+
+    def append_values(self, ts_ns, o, h, l, c, v):
+        row = (ts_ns, o, h, l, c, v)
+        i = self._next
+        self._buf[i] = row
+        self._buf[i + self.capacity] = row
+        self._next = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def append(self, candle):
+        """Aceita o dict de candle do ingest ({'timestamp', 'o', 'h', 'l', 'c', 'v'})."""
+        self.append_values(pd.Timestamp(candle["timestamp"]).value, candle["o"], candle["h"],
+                           candle["l"], candle["c"], candle["v"])
+
+    def last(self, n=None):
+        """View estruturada das últimas n barras (todas, por padrão), da mais antiga para a mais nova."""
+        n = self.count if n is None else min(n, self.count)
+        end = self._next + self.capacity
+        return self._buf[end - n:end]
+
+    def column(self, name, n=None):
+        return self.last(n)[name]
+
+    def timestamps(self, n=None):
+        return self.column("timestamp", n).view("datetime64[ns]")
+
+    def arrays(self, n=None):
+        """(ts, o, h, l, c, v) das últimas n barras, no formato aceito por signal_engine.evaluate_arrays."""
+        bars = self.last(n)
+        return (bars["timestamp"], bars["o"], bars["h"], bars["l"], bars["c"], bars["v"])
+
+    def last_candle(self):
+        if not self.count:
+            return None
+        row = self.last(1)[0]
+        return {"timestamp": pd.Timestamp(int(row["timestamp"]), tz="UTC"), "o": float(row["o"]),
+                "h": float(row["h"]), "l": float(row["l"]), "c": float(row["c"]), "v": float(row["v"])}
+
+    def to_frame(self, n=None):
+        bars = self.last(n)
+        index = pd.DatetimeIndex(bars["timestamp"].view("datetime64[ns]"), name="timestamp").tz_localize("UTC")
+        return pd.DataFrame({k: bars[k] for k in ("o", "h", "l", "c", "v")}, index=index)
+
+def stack_rings(rings, n):
+    """
+    Junta as últimas n barras de vários CandleRing em arrays 2D (ativos x n),
+    alinhados à direita; quem tem menos de n barras fica com NaN à esquerda.
+    Retorna (ts_ultimo, o, h, l, c, v), no formato de signal_engine.evaluate_batch.
+    """
+    n = max([min(n, len(r)) for r in rings] + [0])
+    out = {k: np.full((len(rings), n), np.nan) for k in ("o", "h", "l", "c", "v")}
+    ts = np.zeros(len(rings), dtype=np.int64)
+    for i, ring in enumerate(rings):
+        bars = ring.last(n)
+        k = len(bars)
+        if not k:
+            continue
+        ts[i] = bars["timestamp"][-1]
+        for name, arr in out.items():
+            arr[i, n - k:] = bars[name]
+    return ts, out["o"], out["h"], out["l"], out["c"], out["v"]
@@ -0,0 +1,49 @@
+# candle_store.py — leitura de candles por ativo e janela de tempo
+import pandas as pd
+from sqlalchemy import select
+from db import engine, Candle
+
+CANDLE_COLUMNS = ("o", "h", "l", "c", "v")
+
+def to_db_time(value):
+    """Converte datetime/str/Timestamp para o datetime naive em UTC gravado no banco."""
+    if value is None:
+        return None
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.to_pydatetime()
+
+def candle_query(asset, start=None, end=None, columns=None, limit=None):
+    """SELECT pela chave (ativo, timestamp): intervalo [start, end), ordenado por timestamp."""
+    columns = CANDLE_COLUMNS if columns is None else columns
+    unknown = set(columns) - set(CANDLE_COLUMNS)
+    if unknown:
+        raise ValueError(f"unknown candle columns: {sorted(unknown)}")
+    t = Candle.__table__
+    q = select(t.c.timestamp, *[t.c[col] for col in columns]).where(t.c.ativo == asset)
+    if start is not None:
+        q = q.where(t.c.timestamp >= to_db_time(start))
+    if end is not None:
+        q = q.where(t.c.timestamp < to_db_time(end))
+    q = q.order_by(t.c.timestamp)
+    if limit is not None:
+        q = q.limit(limit)
+    return q
+
+def load_candles(asset, start=None, end=None, columns=None):
+    """DataFrame indexado por timestamp com os candles de `asset` em [start, end)."""
+    q = candle_query(asset, start, end, columns)
+    with engine.connect() as conn:
+        df = pd.read_sql(q, conn, parse_dates=["timestamp"])
+    if df.empty:
+        return None
+    return df.set_index("timestamp")
+
+def iter_candles(asset, start=None, end=None, columns=None, limit=None, chunk_size=5000):
+    """Gera lotes de linhas (tuplas) sem carregar a janela inteira em memória."""
+    q = candle_query(asset, start, end, columns, limit)
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(q)
+        for rows in result.partitions():
+            yield rows
@@ -3,6 +3,25 @@ WS_URL = "wss://symbol-prices-api.mybroker.dev/socket.io/?EIO=4&transport=websoc
 MONITORED_ASSETS = ["EURUSD", "BTCUSDT", "USDJPY", "ETHUSDT", "XRPUSDT", "SOLUSDT", "GBPUSD", "EURGBP"]  # example: edit as needed
 MIN_CONFLUENCES = 3
 TIMEFRAME = "1m"
+ROLLUP_TIMEFRAMES = ["5m", "15m", "1h"]  # montados a partir dos candles de 1m
+SIGNAL_TIMEFRAMES = ["1m"]  # timeframes em que evaluate_signal roda
+INGEST_WORKERS = 1  # >1: ativos divididos entre processos (supervisor.py)
+HEARTBEAT_INTERVAL = 5    # segundos entre heartbeats dos shards
+HEARTBEAT_TIMEOUT = 30    # shard sem heartbeat por esse tempo é reiniciado
+TICK_GRACE_MS = 0  # espera por ticks atrasados antes de fechar o minuto
+CLOSE_SCHEDULER = True  # fecha o minuto de todos os ativos pelo relógio (UTC), sem esperar o próximo tick
+CLOSE_GRACE_MS = 500    # espera após a virada do minuto por ticks atrasados antes do fechamento agendado
+CLOSE_DRAIN_MAX_MS = 300  # tempo máximo esperando as filas de ticks esvaziarem antes de fechar
+GAP_FILL_MAX_MINUTES = 5  # minuto sem tick vira candle flat (v=0, não gravado) até N minutos após o último negociado; 0 desliga
+INGEST_QUEUE_SIZE = 1000  # itens pendentes por ativo entre o socket.io e o processamento (0: processa inline)
+INGEST_QUEUE_POLICY = "coalesce"  # "coalesce" | "drop" (ver tick_queue.py); fila cheia sempre descarta
+BATCH_EVAL = "auto"  # True | False | "auto": avalia os 1m fechados de todos os ativos juntos (evaluate_batch)
+BATCH_EVAL_MIN_ASSETS = 200  # "auto" só liga o lote a partir de N ativos (abaixo, N x evaluate_state é mais rápido)
+BATCH_EVAL_WINDOW_MS = 200  # espera máxima após o primeiro fechamento do minuto (sai antes se todos fecharem)
+BATCH_EVAL_BARS = 500  # barras por ativo no lote (EMA21 já convergida)
+HYDRATE_BARS = 500  # candles por ativo/timeframe recarregados na partida (warm_start.py)
+CANDLE_SNAPSHOT_DIR = "snapshots"  # snapshot dos buffers (None desliga); completa o banco na partida
+SNAPSHOT_INTERVAL = 300  # segundos entre snapshots (e um na saída)
 EMA_SHORT = 9
 EMA_LONG = 21
 RSI_PERIOD = 14
@@ -17,4 +36,18 @@ WEIGHTS = {
     "sr": 0.15
 }
 DB_PATH = "signals.db"
+WRITER_QUEUE_SIZE = 50000   # linhas pendentes antes de descartar
+WRITER_BATCH_SIZE = 500
+WRITER_FLUSH_INTERVAL = 1.0  # segundos
+RETENTION_DAYS = {"candles": 30, "candles_tf": 365, "signals": 90}  # None/0 mantém a tabela inteira
+DOWNSAMPLE_TIMEFRAMES = ["5m", "15m", "1h"]  # gravados em candles_tf antes de apagar 1m antigos
+MAINTENANCE_ARCHIVE_DIR = "archive"  # dias de 1m apagados vão para o candle_archive (None: só apaga)
+MAINTENANCE_INTERVAL = 6 * 3600  # segundos entre execuções (0 desliga o agendamento na API)
+MAINTENANCE_BATCH_ROWS = 5000  # linhas por transação de DELETE
+MAINTENANCE_PAUSE = 0.05  # segundos entre transações, para o db_writer entrar
 TOP_N = 10
+INDICATOR_CACHE_MB = 512  # limite do cache de séries do backtest (--cache)
+STREAM_CHUNK_BARS = 100_000  # candles lidos por vez no backtest --stream
+METRICS_ENABLED = True  # histogramas/contadores do pipeline em /metrics
+SIGNAL_CACHE_TOP = 200       # maiores probabilidades mantidas em memória (global e por ativo)
+SIGNAL_CACHE_HISTORY = 1000  # últimos sinais mantidos em memória
@@ -2,11 +2,22 @@
 import asyncio
 import socketio
 import pandas as pd
-from collections import defaultdict, deque
+from collections import defaultdict
 from datetime import datetime, timezone
-from signal_engine import evaluate_signal
-from db import SessionLocal, Signal, Candle
-from config import WS_URL, MONITORED_ASSETS
+from signal_engine import evaluate_state, evaluate_batch
+from indicators import IndicatorState
+from db_writer import writer
+from config import (WS_URL, MONITORED_ASSETS, TICK_GRACE_MS, ROLLUP_TIMEFRAMES, SIGNAL_TIMEFRAMES,
+                    BATCH_EVAL, BATCH_EVAL_MIN_ASSETS, BATCH_EVAL_WINDOW_MS, BATCH_EVAL_BARS, HYDRATE_BARS,
+                    CANDLE_SNAPSHOT_DIR, SNAPSHOT_INTERVAL, INGEST_QUEUE_SIZE, INGEST_QUEUE_POLICY,
+                    EMA_SHORT, EMA_LONG, RSI_PERIOD, BB_PERIOD, BB_STD, CLOSE_SCHEDULER, CLOSE_GRACE_MS,
+                    CLOSE_DRAIN_MAX_MS, GAP_FILL_MAX_MINUTES)
+from aggregator import MinuteAggregator, RollupAggregator, MINUTE_MS
+import warm_start
+from feed_replay import FeedRecorder
+from candle_ring import CandleRing, stack_rings
+from tick_queue import TickQueue
+import metrics
 import os, logging, time
 from notifier import notify_if_needed
 
@@ -14,17 +25,76 @@ LOG = logging.getLogger("data_ingest")
 LOG.setLevel(logging.INFO)
 
 sio = socketio.AsyncClient(logger=False, engineio_logger=False)
-tick_buffers = defaultdict(list)
-candles_buf = defaultdict(lambda: deque(maxlen=2000))
+aggregators = defaultdict(lambda: MinuteAggregator(grace_ms=TICK_GRACE_MS, gap_fill=GAP_FILL_MAX_MINUTES))
+candles_buf = defaultdict(lambda: CandleRing(2000))
+rollups = defaultdict(lambda: RollupAggregator(ROLLUP_TIMEFRAMES))
+rollup_buf = defaultdict(lambda: CandleRing(500))  # (symbol, tf) -> candles 5m/15m/1h
+new_indicator_state = lambda: IndicatorState(EMA_SHORT, EMA_LONG, RSI_PERIOD, BB_PERIOD, BB_STD)
+indicator_states = defaultdict(new_indicator_state)  # (symbol, tf) -> estado incremental
+tick_queues = {}     # symbol -> TickQueue (recebimento desacoplado do processamento)
+queue_workers = {}   # symbol -> task que consome a fila
+close_locks = defaultdict(asyncio.Lock)  # symbol -> ordem de entrada no ring dos candles fechados
+pending_batch = set()  # ativos com 1m fechado aguardando evaluate_batch
+_batch_minute = None
+_batch_task = None
 WS_AUTH_PARAMS = os.getenv("WS_AUTH_PARAMS")
+monitored = set(MONITORED_ASSETS)
+# em processos de shard (supervisor.py) o processo da API grava e notifica os sinais
+persist_signals = True
+notify_signals = True
+FEED_CAPTURE_PATH = os.getenv("FEED_CAPTURE_PATH")  # grava o feed bruto (.jsonl.gz) para feed_replay.py
+hydration = {"seconds": 0.0, "bars": 0}  # última reidratação (hydrate_buffers)
 
-async def connect_and_listen(on_new_signal):
-    connect_url = WS_URL
-    if WS_AUTH_PARAMS:
+metrics.register_gauge("valory_late_ticks", lambda: {(("asset", s),): a.late_ticks for s, a in list(aggregators.items())},
+                       "Ticks dropped because their minute was already closed")
+metrics.register_gauge("valory_ingest_lag_seconds", lambda: {(("asset", s),): q.lag() for s, q in list(tick_queues.items())},
+                       "Age of the oldest tick waiting in the ingest queue")
+metrics.register_gauge("valory_ingest_queue_depth", lambda: {(("asset", s),): len(q) for s, q in list(tick_queues.items())},
+                       "Items waiting in the ingest queue")
+metrics.register_gauge("valory_ticks_coalesced", lambda: {(("asset", s),): q.coalesced for s, q in list(tick_queues.items())},
+                       "Ticks merged into a pending item of the same minute")
+metrics.describe("valory_minute_close_delay_seconds",
+                 "Time from the minute boundary until the scheduled close finished evaluating all assets")
+metrics.register_gauge("valory_hydration_seconds", lambda: hydration["seconds"],
+                       "Time spent reloading candle history at startup")
+metrics.register_gauge("valory_hydrated_bars", lambda: hydration["bars"], "Candles reloaded at startup")
+
+async def connect_and_listen(on_new_signal, url=None, assets=None, hydrate=True, snapshot=True):
+    """
+    Conecta no feed e processa ticks até ser cancelada. `hydrate` recarrega o
+    histórico (banco/snapshot) antes de conectar; `snapshot` grava os buffers
+    em CANDLE_SNAPSHOT_DIR periodicamente e na saída. O replay (feed_replay.py)
+    desliga os dois: nem lê nem sobrescreve o estado de produção.
+    """
+    global monitored
+    if assets is not None:
+        monitored = set(assets)
+    connect_url = url or WS_URL
+    if WS_AUTH_PARAMS and not url:
         sep = "&" if "?" in connect_url else "?"
         connect_url = connect_url + sep + WS_AUTH_PARAMS
 
+    recorder = FeedRecorder(FEED_CAPTURE_PATH) if FEED_CAPTURE_PATH else None
+    if recorder:
+        LOG.info(f"Capturing raw feed to {FEED_CAPTURE_PATH}")
+
+    # handlers registrados antes de conectar para não perder as primeiras mensagens
+    @sio.event
+    async def connect():
+        LOG.info("socketio connected")
+
+    @sio.on("message", namespace="/symbol-prices")
+    async def on_price_message(payload):
+        if recorder:
+            recorder.record(payload)
+        await handle_real_valory_payload(payload, on_new_signal)
+
+    # numa thread: a leitura do banco + replay nos rollups pode passar de HEARTBEAT_TIMEOUT, e com
+    # o loop livre o heartbeat do shard (supervisor.py) continua saindo; ainda não há ticks chegando
+    if hydrate:
+        await asyncio.get_running_loop().run_in_executor(None, hydrate_buffers, monitored)
     LOG.info(f"Connecting to {connect_url}")
+    writer.start()
 
     await sio.connect(
         connect_url,
@@ -33,22 +103,116 @@ async def connect_and_listen(on_new_signal):
     )
 
     LOG.info("Connected to WS namespace /symbol-prices")
+    closer = asyncio.ensure_future(minute_close_loop(on_new_signal)) if CLOSE_SCHEDULER else None
 
-    @sio.event
-    async def connect():
-        LOG.info("socketio connected")
+    snapshot = snapshot and CANDLE_SNAPSHOT_DIR
+    try:
+        next_snapshot = time.monotonic() + SNAPSHOT_INTERVAL
+        while True:
+            await asyncio.sleep(1)
+            if snapshot and time.monotonic() >= next_snapshot:
+                next_snapshot = time.monotonic() + SNAPSHOT_INTERVAL
+                # cópia no loop, gravação fora dele
+                bars = snapshot_bars(monitored)
+                await asyncio.get_running_loop().run_in_executor(None, _write_snapshot, bars)
+    finally:
+        if closer:
+            closer.cancel()
+        stop_queue_workers()
+        if recorder:
+            recorder.close()
+        if snapshot:
+            _write_snapshot(snapshot_bars(monitored))
 
-    @sio.on("message", namespace="/symbol-prices")
-    async def on_price_message(payload):
-        await handle_real_valory_payload(payload, on_new_signal)
+def hydrate_buffers(symbols, n=HYDRATE_BARS, snapshot_dir=CANDLE_SNAPSHOT_DIR):
+    """
+    Recarrega os últimos n candles (1m e rollups) de cada ativo a partir do
+    banco/snapshot e reconstrói ring, IndicatorState e rollups parciais, para
+    que os sinais voltem a sair logo após um restart. Ativos que já têm
+    histórico em memória (reconexão no mesmo processo) não são tocados.
+    """
+    t0 = time.perf_counter()
+    symbols = [s for s in symbols if not len(candles_buf[s])]
+    if not symbols:
+        return
+    history = warm_start.load_history(symbols, n, ROLLUP_TIMEFRAMES, snapshot_dir)
+    total = hydrated = 0
+    for symbol in symbols:
+        bars = history.get((symbol, "1m"))
+        if bars is None:
+            continue
+        hydrated += 1
+        candles = _bar_candles(bars)
+        _seed(symbol, "1m", candles)
+        derived = defaultdict(list)
+        for candle in candles:
+            # refaz o período em aberto de cada rollup; os fechados vêm do banco quando existem
+            for tf, tf_candle in rollups[symbol].add(candle):
+                derived[tf].append(tf_candle)
+        # minutos já gravados não são reabertos por ticks atrasados; o gap fill continua do último candle
+        minutes = bars["timestamp"] // (MINUTE_MS * 1_000_000)
+        traded = minutes[bars["v"] > 0]
+        aggregators[symbol].resume(int(minutes[-1]), float(bars["c"][-1]), int(traded[-1]) if len(traded) else None)
+        total += len(bars)
+        for tf in ROLLUP_TIMEFRAMES:
+            tf_bars = history.get((symbol, tf))
+            tf_candles = _bar_candles(tf_bars) if tf_bars is not None else derived[tf][-n:]
+            _seed(symbol, tf, tf_candles)
+            total += len(tf_candles)
+    hydration["seconds"] = time.perf_counter() - t0
+    hydration["bars"] = total
+    LOG.info(f"Hydrated {total} candles for {hydrated}/{len(symbols)} assets "
+             f"in {hydration['seconds'] * 1000:.0f} ms")
 
-    while True:
-        await asyncio.sleep(1)
+def _bar_candles(bars):
+    return [{"timestamp": pd.Timestamp(int(row["timestamp"]), tz="UTC"), "o": float(row["o"]), "h": float(row["h"]),
+             "l": float(row["l"]), "c": float(row["c"]), "v": float(row["v"])} for row in bars]
+
+def _seed(symbol, tf, candles):
+    ring = candles_buf[symbol] if tf == "1m" else rollup_buf[(symbol, tf)]
+    state = None
+    if _needs_state(tf):
+        state = indicator_states[(symbol, tf)] = new_indicator_state()
+    for candle in candles:
+        ring.append(candle)
+        if state:
+            state.update(candle)
+
+def _needs_state(tf):
+    # o IndicatorState só é lido por evaluate_state: timeframes sem sinal e o 1m
+    # avaliado em lote (evaluate_batch lê o ring) não precisam mantê-lo
+    return tf in SIGNAL_TIMEFRAMES and not (tf == "1m" and batch_eval())
+
+def batch_eval():
+    """O 1m é avaliado em lote (evaluate_batch)? Com "auto", só a partir de BATCH_EVAL_MIN_ASSETS ativos."""
+    if BATCH_EVAL == "auto":
+        return len(monitored) >= BATCH_EVAL_MIN_ASSETS
+    return bool(BATCH_EVAL)
+
+def snapshot_bars(symbols):
+    """Cópia dos rings (1m e rollups) dos ativos, no formato de warm_start.write_snapshot."""
+    out = {}
+    for symbol in symbols:
+        if len(candles_buf.get(symbol, ())):
+            out[(symbol, "1m")] = candles_buf[symbol].last().copy()
+        for tf in ROLLUP_TIMEFRAMES:
+            ring = rollup_buf.get((symbol, tf))
+            if ring is not None and len(ring):
+                out[(symbol, tf)] = ring.last().copy()
+    return out
+
+def _write_snapshot(bars):
+    try:
+        warm_start.write_snapshot(CANDLE_SNAPSHOT_DIR, bars)
+    except Exception:
+        LOG.exception("Candle snapshot failed")
 
 async def handle_real_valory_payload(raw, on_new_signal):
+    t0 = time.perf_counter() if metrics.enabled else 0.0
     try:
         if not isinstance(raw, list) or len(raw) != 2:
             LOG.debug(f"Unexpected payload: {raw}")
+            metrics.inc("valory_dropped_total", reason="malformed")
             return
 
         event_name = raw[0]
@@ -69,87 +233,223 @@ async def handle_real_valory_payload(raw, on_new_signal):
 
         if not symbol:
             LOG.debug(f"Symbol not found in payload: {raw}")
+            metrics.inc("valory_dropped_total", reason="no_symbol")
             return
 
-        if symbol not in MONITORED_ASSETS:
+        if symbol not in monitored:
             return
 
         price = data.get("price") or data.get("p") or data.get("last")
         if price is None:
             LOG.debug(f"Price not found in payload: {raw}")
+            metrics.inc("valory_dropped_total", reason="no_price")
             return
         try:
             price = float(price)
         except:
+            metrics.inc("valory_dropped_total", reason="bad_price")
             return
 
         ts = data.get("timestamp") or data.get("ts") or data.get("time")
-        if ts:
-            try:
-                ts_pd = pd.to_datetime(ts, unit='ms', utc=True)
-            except:
-                ts_pd = pd.Timestamp.utcnow()
-        else:
-            ts_pd = pd.Timestamp.utcnow()
+        try:
+            ts_ms = float(ts)
+        except (TypeError, ValueError):
+            ts_ms = time.time() * 1000
 
-        tick_buffers[symbol].append((ts_pd, price))
-        await try_build_candle(symbol, on_new_signal)
+        if metrics.enabled:
+            metrics.observe("valory_stage_seconds", time.perf_counter() - t0, stage="parse")
+            metrics.inc("valory_ticks_total", asset=symbol)
+        if INGEST_QUEUE_SIZE > 0:
+            await enqueue_tick(symbol, ts_ms, price, on_new_signal)
+        else:
+            await try_build_candle(symbol, ts_ms, price, on_new_signal)
 
     except Exception:
         LOG.exception("Error processing real Valory payload")
+        metrics.inc("valory_dropped_total", reason="error")
 
-async def try_build_candle(symbol, on_new_signal):
-    ticks = tick_buffers[symbol]
-    if not ticks:
-        return
-    df = pd.DataFrame(ticks, columns=['ts', 'price'])
-    df['minute'] = df['ts'].dt.floor('T')
-    minutes = sorted(df['minute'].unique())
-    for minute in minutes[:-1]:
-        group = df[df['minute'] == minute]
-        if group.empty:
-            continue
-        o = group['price'].iloc[0]
-        h = group['price'].max()
-        l = group['price'].min()
-        c = group['price'].iloc[-1]
-        v = len(group)
-        candle_ts = pd.to_datetime(minute)
-        candles_buf[symbol].append({
-            "timestamp": candle_ts,
-            "o": o, "h": h, "l": l, "c": c, "v": v
-        })
-        tick_buffers[symbol] = [
-            (ts, p) for ts, p in ticks if ts.floor('T') > minute
-        ]
+async def try_build_candle(symbol, ts_ms, price, on_new_signal):
+    if metrics.enabled:
+        t0 = time.perf_counter()
+        closed = aggregators[symbol].add_tick(ts_ms, price)
+        metrics.observe("valory_stage_seconds", time.perf_counter() - t0, stage="candle_build")
+    else:
+        closed = aggregators[symbol].add_tick(ts_ms, price)
+    if closed:
+        await process_closed(symbol, closed, on_new_signal)
+
+async def enqueue_tick(symbol, ts_ms, price, on_new_signal):
+    """Só enfileira: o fechamento de candles e a avaliação rodam em _consume_ticks, um por ativo."""
+    q = tick_queues.get(symbol)
+    if q is None:
+        q = tick_queues[symbol] = TickQueue(INGEST_QUEUE_SIZE, INGEST_QUEUE_POLICY)
+        queue_workers[symbol] = asyncio.ensure_future(_consume_ticks(symbol, q, on_new_signal))
+    if not await q.put(ts_ms, price):
+        metrics.inc("valory_dropped_total", reason="ingest_queue_full")
+
+async def _consume_ticks(symbol, q, on_new_signal):
+    while True:
+        items = await q.get_all()
+        q.busy = True
         try:
-            with SessionLocal() as s:
-                s.add(Candle(timestamp=candle_ts.to_pydatetime(), ativo=symbol, o=o, h=h, l=l, c=c, v=v))
-                s.commit()
+            for minute, o, h, l, c, n, ts_open, ts_close, _ in items:
+                t0 = time.perf_counter() if metrics.enabled else 0.0
+                agg = aggregators[symbol]
+                if n == 1:
+                    closed = agg.add_tick(ts_close, c)
+                else:
+                    closed = agg.add_bar(minute, o, h, l, c, n, ts_open, ts_close)
+                if metrics.enabled:
+                    metrics.observe("valory_stage_seconds", time.perf_counter() - t0, stage="candle_build")
+                if closed:
+                    await process_closed(symbol, closed, on_new_signal)
         except Exception:
-            LOG.exception("DB store candle failed")
-        dfc = pd.DataFrame(list(candles_buf[symbol]))
-        if dfc.empty:
-            continue
-        dfc = dfc.set_index("timestamp")
-        signal = evaluate_signal(dfc, symbol, volume_proxy_series=dfc['v'])
-        if signal:
-            try:
-                with SessionLocal() as s:
-                    sig = Signal(timestamp=pd.Timestamp.utcnow().to_pydatetime(), ativo=signal['ativo'],
-                                 minuto_entrada=pd.to_datetime(signal['minuto_entrada']).to_pydatetime(),
-                                 tipo=signal['tipo'], confluencias=signal['confluencias'],
-                                 probabilidade=signal['probabilidade'], detalhes=signal['detalhes'],
-                                 expiracao_sugerida_min=signal['expiracao_sugerida_min'])
-                    s.add(sig)
-                    s.commit()
-            except Exception:
-                LOG.exception("Saving signal to DB failed")
-            try:
-                notify_if_needed(signal)
-            except:
-                LOG.exception("Notifier error")
-            try:
-                await on_new_signal(signal)
-            except:
-                LOG.exception("on_new_signal callback failed")
+            LOG.exception(f"Error processing queued ticks for {symbol}")
+        finally:
+            q.busy = False
+
+async def drain_queues(timeout=None):
+    """Espera as filas de ticks esvaziarem (ou `timeout` segundos); retorna False se o tempo acabou."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while any(len(q) or q.busy for q in tick_queues.values()):
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(0.001)
+    return True
+
+async def minute_close_loop(on_new_signal, grace_ms=CLOSE_GRACE_MS):
+    """
+    Fecha os candles pelo relógio: CLOSE_GRACE_MS depois de cada virada de
+    minuto UTC, close_minute() em todos os ativos monitorados. Sem isso um
+    ativo pouco negociado só fecha o minuto quando chega o próximo tick dele.
+    Supõe timestamps do feed em ms UTC próximos do relógio local.
+    """
+    while True:
+        now_ms = time.time() * 1000
+        minute = int(now_ms // MINUTE_MS) + 1
+        await asyncio.sleep(max(0.0, (minute * MINUTE_MS + grace_ms - now_ms) / 1000))
+        try:
+            await close_minute(minute, on_new_signal)
+        except Exception:
+            LOG.exception("Scheduled minute close failed")
+
+async def close_minute(minute, on_new_signal):
+    """
+    Fecha, em todos os ativos monitorados, os minutos anteriores a `minute`
+    (epoch ms // 60000) e avalia o lote na hora. Minutos sem nenhum tick saem
+    do próprio agregador como candles flat (MinuteAggregator.gap_fill).
+    """
+    # ticks já recebidos do minuto que fecha ainda podem estar na fila
+    if not await drain_queues(timeout=CLOSE_DRAIN_MAX_MS / 1000):
+        metrics.inc("valory_close_drain_timeouts_total")
+    for symbol in sorted(monitored):
+        closed = aggregators[symbol].close_until(minute)
+        if closed:
+            await process_closed(symbol, closed, on_new_signal)
+    await flush_batch(on_new_signal)
+    metrics.observe("valory_minute_close_delay_seconds", time.time() - minute * MINUTE_MS / 1000)
+
+def stop_queue_workers():
+    # as filas usam asyncio.Event do loop atual: um novo connect_and_listen começa do zero
+    for task in queue_workers.values():
+        task.cancel()
+    queue_workers.clear()
+    tick_queues.clear()
+    close_locks.clear()
+
+async def process_closed(symbol, closed, on_new_signal):
+    # o mesmo ativo fecha candles pelo tick, pela fila e pelo close_minute; process_closed_candle
+    # pode parar num await (flush_batch) antes do append, então o lock (FIFO, pego logo depois
+    # do close_until) mantém no ring a ordem em que os candles saíram do agregador
+    async with close_locks[symbol]:
+        for candle in closed:
+            await process_closed_candle(symbol, candle, on_new_signal)
+
+async def process_closed_candle(symbol, candle, on_new_signal):
+    if pending_batch and candle["timestamp"] != _batch_minute:
+        # candle de outro minuto antes do lote sair (replay, feed atrasado): avalia o lote anterior
+        # antes de mexer no ring, senão ele seria avaliado com a barra nova
+        await flush_batch(on_new_signal)
+    candles_buf[symbol].append(candle)
+    # candle flat do gap fill só existe em memória (indicadores contínuos): não vai para o banco,
+    # nem o rollup feito só deles (v=0), para não entrar no histórico do backtest e de /candles
+    if candle.get("filled"):
+        metrics.inc("valory_gap_filled_total", asset=symbol)
+    else:
+        writer.submit_candle(symbol, candle)
+    await update_and_evaluate(symbol, "1m", candle, on_new_signal)
+    for tf, tf_candle in rollups[symbol].add(candle):
+        rollup_buf[(symbol, tf)].append(tf_candle)
+        if tf_candle["v"]:
+            writer.submit_candle(symbol, tf_candle, timeframe=tf)
+        await update_and_evaluate(symbol, tf, tf_candle, on_new_signal)
+
+async def update_and_evaluate(symbol, tf, candle, on_new_signal):
+    t0 = time.perf_counter() if metrics.enabled else 0.0
+    metrics.inc("valory_candles_total", asset=symbol, timeframe=tf)
+    if not _needs_state(tf):
+        if tf in SIGNAL_TIMEFRAMES:
+            await schedule_batch(symbol, candle["timestamp"], on_new_signal)
+        return
+    state = indicator_states[(symbol, tf)]
+    state.update(candle)
+    signal = evaluate_state(state, symbol, timeframe=tf)
+    if metrics.enabled:
+        metrics.observe("valory_stage_seconds", time.perf_counter() - t0, stage="evaluate")
+    if signal:
+        await emit_signal(signal, on_new_signal)
+
+async def schedule_batch(symbol, minute, on_new_signal):
+    """
+    Marca o ativo para a próxima avaliação em lote: sai quando todos os ativos
+    monitorados fecharam o minuto ou, no máximo, BATCH_EVAL_WINDOW_MS depois
+    do primeiro fechamento.
+    """
+    global _batch_task, _batch_minute
+    if _batch_task is None or _batch_task.done() or minute != _batch_minute:
+        _batch_task = asyncio.ensure_future(_flush_batch_later(minute, on_new_signal))
+    _batch_minute = minute
+    pending_batch.add(symbol)
+    if monitored <= pending_batch:
+        await flush_batch(on_new_signal)
+
+async def _flush_batch_later(minute, on_new_signal):
+    await asyncio.sleep(BATCH_EVAL_WINDOW_MS / 1000)
+    # lote deste minuto já saiu (todos fecharam ou chegou candle do minuto seguinte): não
+    # antecipa o lote do minuto novo, que tem a própria janela
+    if _batch_minute == minute:
+        await flush_batch(on_new_signal)
+
+async def flush_batch(on_new_signal):
+    """Avalia de uma vez todos os ativos pendentes (evaluate_batch sobre os candle rings)."""
+    if not pending_batch:
+        return
+    symbols = sorted(pending_batch)
+    pending_batch.clear()
+    t0 = time.perf_counter() if metrics.enabled else 0.0
+    try:
+        signals = evaluate_batch(symbols, *stack_rings([candles_buf[s] for s in symbols], BATCH_EVAL_BARS))
+    except Exception:
+        # não propaga: o flush roda numa task solta (_flush_batch_later) ou no meio de
+        # process_closed_candle, que ainda precisa gravar o candle que chegou
+        LOG.exception(f"Batch evaluation failed for {len(symbols)} assets at {_batch_minute}")
+        metrics.inc("valory_batch_eval_errors_total")
+        return
+    if metrics.enabled:
+        metrics.observe("valory_stage_seconds", time.perf_counter() - t0, stage="evaluate_batch")
+    for signal in signals:
+        await emit_signal(signal, on_new_signal)
+
+async def emit_signal(signal, on_new_signal):
+    metrics.inc("valory_signals_total", asset=signal["ativo"], timeframe=signal.get("timeframe", "1m"))
+    if persist_signals:
+        writer.submit_signal(signal)
+    if notify_signals:
+        try:
+            notify_if_needed(signal)
+        except:
+            LOG.exception("Notifier error")
+    try:
+        await on_new_signal(signal)
+    except:
+        LOG.exception("on_new_signal callback failed")
@@ -1,16 +1,29 @@
 # db.py
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, JSON
+from sqlalchemy import create_engine, event, text, Column, Integer, String, Float, DateTime, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import datetime
 from config import DB_PATH
 
 Base = declarative_base()
-engine = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
+engine = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False, "timeout": 30})
 SessionLocal = sessionmaker(bind=engine)
 
+@event.listens_for(engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _):
+    # WAL: leitores (API) não bloqueiam o writer e commits não fazem fsync do arquivo todo
+    cur = dbapi_conn.cursor()
+    # só tem efeito em banco novo; bancos antigos: python maintenance.py --enable-incremental-vacuum
+    cur.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.close()
+
 class Signal(Base):
     __tablename__ = "signals"
+    # histórico paginado por (timestamp, id), com ou sem filtro de ativo (signal_store.py)
+    __table_args__ = (Index("ix_signals_timestamp_id", "timestamp", "id"),
+                      Index("ix_signals_ativo_timestamp_id", "ativo", "timestamp", "id"))
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
     ativo = Column(String)
@@ -20,9 +33,12 @@ class Signal(Base):
     probabilidade = Column(Float)
     detalhes = Column(JSON)
     expiracao_sugerida_min = Column(Integer)
+    timeframe = Column(String, default="1m")
 
 class Candle(Base):
     __tablename__ = "candles"
+    # uma linha por ativo/minuto; também serve as consultas por janela de tempo
+    __table_args__ = (Index("ux_candles_ativo_timestamp", "ativo", "timestamp", unique=True),)
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime)
     ativo = Column(String)
@@ -32,5 +48,48 @@ class Candle(Base):
     c = Column(Float)
     v = Column(Float)
 
+class RollupCandle(Base):
+    """Candles de timeframes maiores (5m, 15m, 1h...) montados a partir dos de 1m."""
+    __tablename__ = "candles_tf"
+    __table_args__ = (Index("ux_candles_tf_ativo_tf_timestamp", "ativo", "timeframe", "timestamp", unique=True),)
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(DateTime)
+    ativo = Column(String)
+    timeframe = Column(String)
+    o = Column(Float)
+    h = Column(Float)
+    l = Column(Float)
+    c = Column(Float)
+    v = Column(Float)
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _ensure_candle_index()
+    _ensure_columns("signals", {"timeframe": "VARCHAR DEFAULT '1m'"})
+    _ensure_indexes(Signal)
+
+def _ensure_columns(table, columns):
+    # create_all não altera tabelas existentes: adiciona colunas novas
+    with engine.begin() as conn:
+        existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+        for name, ddl in columns.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+def _ensure_indexes(model):
+    # create_all só cria índices junto com a tabela: bancos antigos ganham os novos aqui
+    with engine.begin() as conn:
+        for index in model.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+def _ensure_candle_index():
+    # bancos criados antes do índice composto: remove minutos duplicados e cria o índice
+    with engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type='index' AND name='ux_candles_ativo_timestamp'")).first()
+        if exists:
+            return
+        conn.execute(text(
+            "DELETE FROM candles WHERE id NOT IN (SELECT MIN(id) FROM candles GROUP BY ativo, timestamp)"))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX ux_candles_ativo_timestamp ON candles (ativo, timestamp)"))
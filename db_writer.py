@@ -0,0 +1,165 @@
+# db_writer.py — gravação em lote (write-behind) de candles e sinais
+import atexit
+import logging
+import queue
+import threading
+import time
+import pandas as pd
+from sqlalchemy import insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from db import engine, Candle, Signal, RollupCandle
+import metrics
+from config import WRITER_QUEUE_SIZE, WRITER_BATCH_SIZE, WRITER_FLUSH_INTERVAL
+
+LOG = logging.getLogger("db_writer")
+LOG.setLevel(logging.INFO)
+
+_STOP = object()
+# (tabela, INSERT) na ordem do flush; minuto repetido (reconexão, reprocessamento) não derruba o lote
+_INSERTS = (("candles", sqlite_insert(Candle.__table__).on_conflict_do_nothing()),
+            ("candles_tf", sqlite_insert(RollupCandle.__table__).on_conflict_do_nothing()),
+            ("signals", insert(Signal.__table__)))
+
+class BatchWriter:
+    """
+    Fila limitada + thread que grava Candle/Signal em lote, uma transação por
+    flush (a cada `flush_interval` segundos ou `batch_size` linhas). O loop de
+    ingestão só faz put_nowait; se a fila encher, a linha é descartada e
+    contada em `dropped` em vez de bloquear o recebimento de ticks.
+    """
+
+    def __init__(self, maxsize=WRITER_QUEUE_SIZE, batch_size=WRITER_BATCH_SIZE, flush_interval=WRITER_FLUSH_INTERVAL):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self.enabled = True  # False descarta tudo (replay sem banco)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def submit_candle(self, symbol, candle, timeframe="1m"):
+        self._put(("candle", (symbol, timeframe), candle))
+
+    def submit_signal(self, signal):
+        self._put(("signal", None, signal))
+
+    def _put(self, item):
+        if not self.enabled:
+            return
+        if self._thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc("valory_dropped_total", reason="db_queue_full")
+            if self.dropped % 1000 == 1:
+                LOG.warning(f"DB writer queue full, dropped {self.dropped} rows so far")
+
+    def stop(self, timeout=10):
+        """Grava o que estiver na fila e encerra a thread (no máximo `timeout` segundos)."""
+        with self._lock:
+            thread = self._thread
+            if not thread or not thread.is_alive():
+                return
+            deadline = time.monotonic() + timeout
+            try:
+                self.queue.put(_STOP, timeout=timeout / 2)
+            except queue.Full:
+                # sobrecarga: a thread grava o lote corrente e sai, o resto da fila é perdido
+                LOG.warning(f"DB writer queue still full at shutdown, abandoning {self.queue.qsize()} rows")
+                self._stop.set()
+            thread.join(max(0.0, deadline - time.monotonic()))
+            self._thread = None
+
+    def _run(self):
+        candles, rollups, signals = [], [], []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is _STOP or self._stop.is_set():
+                self._flush(candles, rollups, signals)
+                return
+            if item is not None:
+                kind, key, row = item
+                try:
+                    if kind == "candle":
+                        symbol, timeframe = key
+                        if timeframe == "1m":
+                            candles.append(_candle_row(symbol, row))
+                        else:
+                            rollups.append(dict(_candle_row(symbol, row), timeframe=timeframe))
+                    else:
+                        signals.append(_signal_row(row))
+                except Exception:
+                    # uma linha malformada não pode derrubar a thread (o resto viraria db_queue_full)
+                    LOG.exception(f"Discarding malformed {kind} row")
+                    metrics.inc("valory_dropped_total", reason="db_bad_row")
+            if len(candles) + len(rollups) + len(signals) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(candles, rollups, signals)
+                candles, rollups, signals = [], [], []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _flush(self, candles, rollups, signals):
+        batches = [(table, stmt, rows) for (table, stmt), rows in zip(_INSERTS, (candles, rollups, signals)) if rows]
+        if not batches:
+            return
+        t0 = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                for _, stmt, rows in batches:
+                    conn.execute(stmt, rows)
+            self.written += sum(len(rows) for _, _, rows in batches)
+            metrics.observe("valory_stage_seconds", time.perf_counter() - t0, stage="db_write")
+            return
+        except Exception:
+            LOG.exception(f"DB batch write failed ({len(candles)} candles, {len(rollups)} rollups, "
+                          f"{len(signals)} signals); retrying table by table")
+        # de novo, uma transação por tabela; a tabela que ainda falhar vai linha a linha,
+        # e só as linhas ruins são descartadas
+        for table, stmt, rows in batches:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(stmt, rows)
+                self.written += len(rows)
+                continue
+            except Exception:
+                pass
+            for row in rows:
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(stmt, [row])
+                    self.written += 1
+                except Exception as e:
+                    LOG.warning(f"Dropping {table} row {row.get('ativo')} {row.get('timestamp')}: "
+                                f"{getattr(e, 'orig', None) or e!r}")
+                    metrics.inc("valory_dropped_total", reason="db_write_error")
+
+def _candle_row(symbol, candle):
+    return {"timestamp": pd.Timestamp(candle['timestamp']).to_pydatetime(), "ativo": symbol,
+            "o": candle['o'], "h": candle['h'], "l": candle['l'], "c": candle['c'], "v": candle['v']}
+
+def _signal_row(signal):
+    return {"timestamp": pd.Timestamp(signal['timestamp']).to_pydatetime(), "ativo": signal['ativo'],
+            "minuto_entrada": pd.to_datetime(signal['minuto_entrada']).to_pydatetime(),
+            "tipo": signal['tipo'], "confluencias": signal['confluencias'],
+            "probabilidade": signal['probabilidade'], "detalhes": signal['detalhes'],
+            "expiracao_sugerida_min": signal['expiracao_sugerida_min'],
+            "timeframe": signal.get('timeframe', "1m")}
+
+writer = BatchWriter()
+metrics.register_gauge("valory_db_queue_depth", lambda: writer.queue.qsize(), "Rows waiting for the DB writer")
+atexit.register(writer.stop)
@@ -0,0 +1,200 @@
+# feed_replay.py — captura do feed bruto e replay em velocidade máxima pelo pipeline real
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import time
+import numpy as np
+
+LOG = logging.getLogger("feed_replay")
+LOG.setLevel(logging.INFO)
+
+NAMESPACE = "/symbol-prices"
+
+class FeedRecorder:
+    """Grava cada payload recebido como uma linha JSON {"t": epoch_s, "p": payload} em .jsonl.gz."""
+
+    def __init__(self, path):
+        self._f = gzip.open(path, "at", encoding="utf-8")
+        self.count = 0
+
+    def record(self, payload):
+        self._f.write(json.dumps({"t": time.time(), "p": payload}, separators=(",", ":")))
+        self._f.write("\n")
+        self.count += 1
+
+    def close(self):
+        self._f.close()
+
+def read_recording(path):
+    """Gera (t, payload) de uma gravação."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                rec = json.loads(line)
+                yield rec["t"], rec["p"]
+
+class ReplayStats:
+    """Contadores do replay: ticks, candles fechados, latência de fechamento e sinais."""
+
+    def __init__(self):
+        self.ticks = 0
+        self.candles = 0
+        self.signals = 0
+        self.close_latencies = []
+        self._closing = {}  # (ativo, minuto) -> início do fechamento, até o flush_batch do lote
+        self.started = None
+        self.finished = None
+
+    async def on_new_signal(self, signal):
+        self.signals += 1
+
+    def wrap_close(self, process_closed_candle, batched=False):
+        # tempo entre fechar o minuto e terminar candle + avaliação + envio dos sinais; com
+        # avaliação em lote o 1m só é avaliado no flush_batch, e wrap_flush fecha a medida
+        async def timed(symbol, candle, on_new_signal):
+            t0 = time.perf_counter()
+            if batched:
+                self._closing[(symbol, candle["timestamp"])] = t0
+            await process_closed_candle(symbol, candle, on_new_signal)
+            if not batched:
+                self.close_latencies.append(time.perf_counter() - t0)
+            self.candles += 1
+        return timed
+
+    def wrap_flush(self, flush_batch, ingest):
+        async def timed(on_new_signal):
+            minute, symbols = ingest._batch_minute, list(ingest.pending_batch)
+            await flush_batch(on_new_signal)
+            t1 = time.perf_counter()
+            for symbol in symbols:
+                t0 = self._closing.pop((symbol, minute), None)
+                if t0 is not None:
+                    self.close_latencies.append(t1 - t0)
+        return timed
+
+    def report(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        lat = np.array(self.close_latencies) * 1000
+        pct = (lambda q: round(float(np.percentile(lat, q)), 3)) if len(lat) else (lambda q: None)
+        return {
+            "ticks": self.ticks,
+            "elapsed_s": round(elapsed, 3),
+            "ticks_per_s": round(self.ticks / elapsed, 1) if elapsed > 0 else None,
+            "candles_closed": self.candles,
+            "candle_close_latency_ms": {"p50": pct(50), "p95": pct(95), "p99": pct(99),
+                                        "max": round(float(lat.max()), 3) if len(lat) else None},
+            "signals": self.signals,
+        }
+
+async def _paced(records, speed):
+    """Repete os registros respeitando o intervalo gravado / speed (speed <= 0: sem espera)."""
+    first_t = None
+    start = time.perf_counter()
+    for t, payload in records:
+        if speed > 0:
+            if first_t is None:
+                first_t = t
+            delay = (t - first_t) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        yield payload
+
+async def replay_direct(path, speed, stats):
+    import data_ingest
+    stats.started = time.perf_counter()
+    async for payload in _paced(read_recording(path), speed):
+        stats.ticks += 1
+        await data_ingest.handle_real_valory_payload(payload, stats.on_new_signal)
+    await data_ingest.drain_queues()
+    await data_ingest.flush_batch(stats.on_new_signal)
+    stats.finished = time.perf_counter()
+
+async def replay_socketio(path, speed, stats, port):
+    """Sobe um servidor socket.io local no namespace /symbol-prices e conecta o cliente real nele."""
+    import socketio
+    from aiohttp import web
+    import data_ingest
+
+    server = socketio.AsyncServer(async_mode="aiohttp")
+    app = web.Application()
+    server.attach(app)
+    client_ready = asyncio.Event()
+
+    @server.on("connect", namespace=NAMESPACE)
+    async def on_connect(sid, environ, auth=None):
+        client_ready.set()
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    # conta ticks do lado do cliente para medir o que o pipeline realmente processou
+    handle = data_ingest.handle_real_valory_payload
+    async def counted(raw, on_new_signal):
+        stats.ticks += 1
+        await handle(raw, on_new_signal)
+    data_ingest.handle_real_valory_payload = counted
+
+    # sem hidratar do banco (os minutos gravados seriam dados como fechados) nem gravar snapshot
+    listener = asyncio.ensure_future(data_ingest.connect_and_listen(
+        stats.on_new_signal, url=f"http://127.0.0.1:{port}", hydrate=False, snapshot=False))
+    try:
+        await asyncio.wait_for(client_ready.wait(), 10)
+        sent = 0
+        stats.started = time.perf_counter()
+        async for payload in _paced(read_recording(path), speed):
+            await server.emit("message", payload, namespace=NAMESPACE)
+            sent += 1
+        while stats.ticks < sent:
+            await asyncio.sleep(0.01)
+        await data_ingest.drain_queues()
+        stats.finished = time.perf_counter()
+    finally:
+        listener.cancel()
+        data_ingest.handle_real_valory_payload = handle
+        await data_ingest.sio.disconnect()
+        await runner.cleanup()
+
+def run_replay(path, speed=0, via_socketio=False, port=8799, use_db=False, notify=False):
+    import data_ingest
+    import notifier
+    from db_writer import writer
+    writer.enabled = use_db
+    if use_db:
+        from db import init_db
+        init_db()  # fora da API ninguém criou as tabelas
+    if not notify:
+        notifier.dispatcher.destinations = []
+    # a gravação tem timestamps antigos: os minutos fecham pelos ticks, não pelo relógio
+    data_ingest.CLOSE_SCHEDULER = False
+    stats = ReplayStats()
+    batched = data_ingest.batch_eval() and "1m" in data_ingest.SIGNAL_TIMEFRAMES
+    data_ingest.process_closed_candle = stats.wrap_close(data_ingest.process_closed_candle, batched)
+    if batched:
+        data_ingest.flush_batch = stats.wrap_flush(data_ingest.flush_batch, data_ingest)
+    if via_socketio:
+        asyncio.run(replay_socketio(path, speed, stats, port))
+    else:
+        asyncio.run(replay_direct(path, speed, stats))
+    writer.stop()
+    return stats.report()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a feed captured with FEED_CAPTURE_PATH through the ingest pipeline")
+    parser.add_argument("recording", help=".jsonl.gz file written by FeedRecorder")
+    parser.add_argument("--speed", type=float, default=0, help="N x real time; 0 = as fast as possible")
+    parser.add_argument("--socketio", action="store_true", help="go through a local socket.io server instead of calling the handler")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--db", action="store_true", help="persist candles/signals (default: writer disabled)")
+    parser.add_argument("--notify", action="store_true", help="send notifications (default: disabled)")
+    parser.add_argument("--out", default=None, help="write the report JSON here")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    report = run_replay(args.recording, speed=args.speed, via_socketio=args.socketio, port=args.port,
+                        use_db=args.db, notify=args.notify)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,117 @@
+# indicator_cache.py — cache em disco (endereçado por conteúdo) das séries de indicadores do backtest
+import hashlib
+import json
+import logging
+import os
+import numpy as np
+
+LOG = logging.getLogger("indicator_cache")
+LOG.setLevel(logging.INFO)
+
+def frame_fingerprint(df, columns=("o", "h", "l", "c")):
+    """Hash dos timestamps + colunas OHLC: qualquer candle alterado/incluído gera outra chave."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(df.index.as_unit("ns").asi8).tobytes())
+    h.update(str(df.index.tz).encode())
+    for col in columns:
+        h.update(col.encode())
+        h.update(np.ascontiguousarray(df[col].to_numpy(dtype=np.float64)).tobytes())
+    return h.hexdigest()
+
+class IndicatorCache:
+    """
+    Séries de indicadores (arrays NumPy) gravadas em <root>/<chave>.npy, com a
+    chave = hash(ativo, fingerprint dos candles, indicador, parâmetros). Como a
+    chave depende do conteúdo dos candles, dados alterados simplesmente não
+    encontram a entrada antiga, que sai pela evicção LRU (mtime, atualizado a
+    cada hit) quando o diretório passa de `max_bytes`.
+    Seguro com vários processos no mesmo diretório (gravação via os.replace).
+    """
+
+    def __init__(self, root, max_bytes=512 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+        self._size = None  # total em disco, calculado na primeira gravação
+
+    @staticmethod
+    def key(asset, fingerprint, name, params):
+        raw = json.dumps([asset, fingerprint, name, params], sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key + ".npy")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            arr = np.load(path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return arr
+
+    def put(self, key, arr):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp, arr)
+        os.replace(tmp, path)
+        if self._size is None:
+            self._size = self._scan_size()
+        else:
+            self._size += os.path.getsize(path)
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def series(self, asset, fingerprint, name, params, compute):
+        """Devolve a série em cache ou chama compute() (-> array) e grava o resultado."""
+        key = self.key(asset, fingerprint, name, params)
+        arr = self.get(key)
+        if arr is not None:
+            self.hits += 1
+            return arr
+        self.misses += 1
+        arr = np.asarray(compute())
+        try:
+            self.put(key, arr)
+        except OSError:
+            LOG.exception(f"Could not write indicator cache entry {name} for {asset}")
+        return arr
+
+    def _entries(self):
+        out = []
+        for entry in os.scandir(self.root):
+            if not entry.name.endswith(".npy") or ".tmp" in entry.name:
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            out.append((st.st_mtime, st.st_size, entry.path))
+        return out
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Remove os arquivos menos usados até o cache voltar a caber em max_bytes."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # outro processo já removeu
+            total -= size
+            removed += 1
+        self._size = total
+        if removed:
+            LOG.debug(f"Indicator cache: evicted {removed} entries, {total / 1e6:.1f} MB left")
@@ -1,4 +1,6 @@
 # indicators.py
+import math
+from collections import deque
 import numpy as np
 import pandas as pd
 
@@ -50,3 +52,162 @@ def calc_support_resistance(highs, lows, lookback=50):
     recent_high = max(highs[-lookback:]) if len(highs)>=1 else None
     recent_low = min(lows[-lookback:]) if len(lows)>=1 else None
     return recent_low, recent_high
+
+
+class IndicatorState:
+    """
+    Estado incremental dos indicadores de um ativo.
+
+    Recebe um candle fechado por vez em `update` e mantém os mesmos valores que
+    ema/rsi/bollinger_bands/calc_support_resistance calculariam sobre a série
+    inteira, sem recalcular a janela toda a cada minuto.
+    """
+    RESYNC_EVERY = 1000  # recalcula somas das janelas para não acumular erro
+
+    def __init__(self, ema_short=9, ema_long=21, rsi_period=14, bb_period=20, bb_std=2, sr_lookback=50):
+        self.ema_short = ema_short
+        self.ema_long = ema_long
+        self.rsi_period = rsi_period
+        self.bb_period = bb_period
+        self.bb_std = bb_std
+        self.sr_lookback = sr_lookback
+        self._alpha_short = 2.0 / (ema_short + 1)
+        self._alpha_long = 2.0 / (ema_long + 1)
+
+        self.count = 0
+        self.last = None
+        self.timestamp = None
+        self.prev_v = None
+        self.ema_s = None
+        self.ema_l = None
+        self._prev_close = None
+
+        # RSI (média simples de ganhos/perdas, igual ao rolling do indicators.rsi)
+        self._ups = deque()
+        self._downs = deque()
+        self._up_sum = 0.0
+        self._down_sum = 0.0
+
+        # Bollinger: média/variância da janela deslizante
+        self._closes = deque()
+        self._bb_mean = 0.0
+        self._bb_m2 = 0.0
+
+        # S/R: deques monotônicos (idx, valor) para máximo/mínimo da janela
+        self._max_highs = deque()
+        self._min_lows = deque()
+
+    @staticmethod
+    def _ewm(prev, x, alpha):
+        # mesma fórmula do ewm(adjust=False) do pandas
+        if prev is None:
+            return x
+        old_wt = 1.0 - alpha
+        return (old_wt * prev + alpha * x) / (old_wt + alpha)
+
+    def update(self, candle):
+        """Aplica um candle fechado ({'timestamp','o','h','l','c','v'})."""
+        o, h, l, c = float(candle['o']), float(candle['h']), float(candle['l']), float(candle['c'])
+        v = candle.get('v')
+        idx = self.count
+
+        self.prev_v = self.last['v'] if self.last is not None else None
+        self.last = {'o': o, 'h': h, 'l': l, 'c': c, 'v': v}
+        self.timestamp = candle.get('timestamp')
+
+        self.ema_s = self._ewm(self.ema_s, c, self._alpha_short)
+        self.ema_l = self._ewm(self.ema_l, c, self._alpha_long)
+
+        if self._prev_close is not None:
+            delta = c - self._prev_close
+            up = delta if delta > 0 else 0.0
+            down = -delta if delta < 0 else 0.0
+            self._ups.append(up)
+            self._downs.append(down)
+            self._up_sum += up
+            self._down_sum += down
+            if len(self._ups) > self.rsi_period:
+                self._up_sum -= self._ups.popleft()
+                self._down_sum -= self._downs.popleft()
+        self._prev_close = c
+
+        self._closes.append(c)
+        if len(self._closes) > self.bb_period:
+            y = self._closes.popleft()
+            n = self.bb_period
+            old_mean = self._bb_mean
+            self._bb_mean += (c - y) / n
+            self._bb_m2 += (c - y) * (c - self._bb_mean + y - old_mean)
+        else:
+            n = len(self._closes)
+            d = c - self._bb_mean
+            self._bb_mean += d / n
+            self._bb_m2 += d * (c - self._bb_mean)
+
+        while self._max_highs and self._max_highs[-1][1] <= h:
+            self._max_highs.pop()
+        self._max_highs.append((idx, h))
+        while self._min_lows and self._min_lows[-1][1] >= l:
+            self._min_lows.pop()
+        self._min_lows.append((idx, l))
+        while self._max_highs[0][0] <= idx - self.sr_lookback:
+            self._max_highs.popleft()
+        while self._min_lows[0][0] <= idx - self.sr_lookback:
+            self._min_lows.popleft()
+
+        self.count += 1
+        if self.count % self.RESYNC_EVERY == 0:
+            self._resync()
+
+    def _resync(self):
+        self._up_sum = math.fsum(self._ups)
+        self._down_sum = math.fsum(self._downs)
+        n = len(self._closes)
+        self._bb_mean = math.fsum(self._closes) / n
+        self._bb_m2 = math.fsum((x - self._bb_mean) ** 2 for x in self._closes)
+
+    def rsi(self):
+        if len(self._ups) < self.rsi_period:
+            return float('nan')
+        rs = (self._up_sum / self.rsi_period) / (self._down_sum / self.rsi_period + 1e-9)
+        return 100 - (100 / (1 + rs))
+
+    def bollinger(self):
+        if len(self._closes) < self.bb_period:
+            nan = float('nan')
+            return nan, nan, nan
+        sd = math.sqrt(max(self._bb_m2, 0.0) / (self.bb_period - 1))
+        ma = self._bb_mean
+        return ma + self.bb_std * sd, ma, ma - self.bb_std * sd
+
+    def support_resistance(self):
+        if not self.count:
+            return None, None
+        return self._min_lows[0][1], self._max_highs[0][1]
+
+
+# --- versões vetorizadas (arrays/Series inteiras) ---
+
+def hammer_mask(o, h, l, c):
+    """detect_hammer aplicado a arrays inteiros."""
+    body = np.abs(c - o)
+    lower_wick = np.minimum(o, c) - l
+    upper_wick = h - np.maximum(o, c)
+    return (body != 0) & (lower_wick >= 2*body) & (upper_wick <= 0.5*body)
+
+def shooting_star_mask(o, h, l, c):
+    """detect_shooting_star aplicado a arrays inteiros."""
+    body = np.abs(c - o)
+    upper_wick = h - np.maximum(o, c)
+    lower_wick = np.minimum(o, c) - l
+    return (body != 0) & (upper_wick >= 2*body) & (lower_wick <= 0.5*body)
+
+def bollinger_touch_masks(price, upper, lower, prox=0.002):
+    """is_bollinger_touch vetorizado: retorna (toque_upper, toque_lower)."""
+    touch_upper = price >= upper*(1-prox)
+    touch_lower = ~touch_upper & (price <= lower*(1+prox))
+    return touch_upper, touch_lower
+
+def rolling_support_resistance(highs: pd.Series, lows: pd.Series, lookback=50):
+    """calc_support_resistance para cada barra: (suporte, resistência)."""
+    return lows.rolling(lookback, min_periods=1).min(), highs.rolling(lookback, min_periods=1).max()
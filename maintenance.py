@@ -0,0 +1,168 @@
+# maintenance.py — retenção, downsampling, arquivo e vacuum do SQLite, em segundo plano
+import argparse
+import json
+import logging
+import threading
+import time
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from db import engine, RollupCandle
+from candle_store import load_candles
+from candle_archive import export_frame
+from aggregator import timeframe_minutes
+import metrics
+from config import (RETENTION_DAYS, DOWNSAMPLE_TIMEFRAMES, MAINTENANCE_ARCHIVE_DIR, MAINTENANCE_INTERVAL,
+                    MAINTENANCE_BATCH_ROWS, MAINTENANCE_PAUSE)
+
+LOG = logging.getLogger("maintenance")
+LOG.setLevel(logging.INFO)
+
+# Tudo aqui roda em transações curtas (um dia de um ativo, ou MAINTENANCE_BATCH_ROWS
+# linhas) com uma pausa entre elas: no WAL o db_writer só espera o lote corrente.
+
+def _cutoff(days, now=None):
+    now = pd.Timestamp.utcnow().tz_localize(None) if now is None else pd.Timestamp(now)
+    return (now - pd.Timedelta(days=days)).floor("D").to_pydatetime()
+
+def downsample(df, tf):
+    """Candles de 1m -> candles de `tf`, períodos alinhados como no RollupAggregator."""
+    bars = df.resample(f"{timeframe_minutes(tf)}min", label="left", closed="left").agg(
+        {"o": "first", "h": "max", "l": "min", "c": "last", "v": "sum"})
+    return bars.dropna(subset=["o"])
+
+def compact_candles(cutoff, archive_dir=MAINTENANCE_ARCHIVE_DIR, timeframes=DOWNSAMPLE_TIMEFRAMES, pause=MAINTENANCE_PAUSE):
+    """
+    Candles de 1m anteriores a `cutoff`, um dia por ativo de cada vez: grava o dia
+    no arquivo colunar (candle_archive), completa candles_tf com os timeframes de
+    `timeframes` que ainda não existirem e apaga o dia de `candles`.
+    """
+    stats = {"deleted": 0, "downsampled": 0, "archived_days": 0}
+    with engine.connect() as conn:
+        firsts = conn.execute(text("SELECT ativo, MIN(timestamp) FROM candles WHERE timestamp < :cutoff GROUP BY ativo"),
+                              {"cutoff": cutoff}).all()
+    for asset, first in firsts:
+        day = pd.Timestamp(first).floor("D")
+        while day < pd.Timestamp(cutoff):
+            end = min(day + pd.Timedelta(days=1), pd.Timestamp(cutoff))
+            df = load_candles(asset, start=day, end=end)
+            if df is not None:
+                if archive_dir:
+                    stats["archived_days"] += export_frame(df, asset, archive_dir)
+                rows = []
+                for tf in timeframes:
+                    for ts, bar in downsample(df, tf).iterrows():
+                        rows.append({"timestamp": ts.to_pydatetime(), "ativo": asset, "timeframe": tf, "o": bar["o"],
+                                     "h": bar["h"], "l": bar["l"], "c": bar["c"], "v": bar["v"]})
+                with engine.begin() as conn:
+                    if rows:
+                        # rollups gravados ao vivo já existem e são mantidos
+                        res = conn.execute(sqlite_insert(RollupCandle.__table__).on_conflict_do_nothing(), rows)
+                        stats["downsampled"] += max(res.rowcount, 0)
+                    res = conn.execute(text("DELETE FROM candles WHERE ativo = :a AND timestamp >= :s AND timestamp < :e"),
+                                       {"a": asset, "s": day.to_pydatetime(), "e": end.to_pydatetime()})
+                    stats["deleted"] += res.rowcount
+                time.sleep(pause)
+            day = end
+    return stats
+
+def delete_older(table, cutoff, batch_rows=MAINTENANCE_BATCH_ROWS, pause=MAINTENANCE_PAUSE):
+    """Apaga as linhas de `table` com timestamp < cutoff, em lotes de batch_rows."""
+    total = 0
+    sql = text(f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE timestamp < :cutoff LIMIT :n)")
+    while True:
+        with engine.begin() as conn:
+            n = conn.execute(sql, {"cutoff": cutoff, "n": batch_rows}).rowcount
+        total += n
+        if n < batch_rows:
+            return total
+        time.sleep(pause)
+
+def incremental_vacuum(pages_per_step=2000, pause=MAINTENANCE_PAUSE):
+    """Devolve ao sistema as páginas livres (auto_vacuum=INCREMENTAL), aos poucos. Retorna páginas liberadas."""
+    freed = 0
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            LOG.info("auto_vacuum is not INCREMENTAL; run `python maintenance.py --enable-incremental-vacuum` once")
+            return 0
+        while True:
+            free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            if not free:
+                break
+            # o sqlite3 do Python dá um só passo no execute (= uma página); executescript roda até o fim
+            conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({pages_per_step});")
+            left = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+            freed += free - left
+            if left >= free:
+                break
+            time.sleep(pause)
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+    return freed
+
+def run_maintenance(retention=RETENTION_DAYS, now=None):
+    """Executa todos os passos e devolve o relatório (linhas removidas e tempo de cada passo)."""
+    t_start = time.perf_counter()
+    report = {"started": pd.Timestamp.utcnow().isoformat(), "steps": {}}
+
+    def step(name, fn):
+        t0 = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            LOG.exception(f"Maintenance step {name} failed")
+            result = {"error": str(e)}
+        if not isinstance(result, dict):
+            result = {"rows": result}
+        result["seconds"] = round(time.perf_counter() - t0, 3)
+        report["steps"][name] = result
+        metrics.observe("valory_stage_seconds", result["seconds"], stage=f"maintenance_{name}")
+
+    if retention.get("candles"):
+        step("candles", lambda: compact_candles(_cutoff(retention["candles"], now)))
+    for table in ("candles_tf", "signals"):
+        if retention.get(table):
+            step(table, lambda table=table: delete_older(table, _cutoff(retention[table], now)))
+    step("vacuum", lambda: {"pages_freed": incremental_vacuum()})
+    report["seconds"] = round(time.perf_counter() - t_start, 3)
+    LOG.info(f"Maintenance done in {report['seconds']}s: {json.dumps(report['steps'])}")
+    return report
+
+class MaintenanceScheduler:
+    """Thread que chama run_maintenance a cada `interval` segundos (a primeira execução logo na partida)."""
+
+    def __init__(self, interval=MAINTENANCE_INTERVAL):
+        self.interval = interval
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not self.interval or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="maintenance", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.last_report = run_maintenance()
+            self._stop.wait(self.interval)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+scheduler = MaintenanceScheduler()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the retention/downsampling/vacuum jobs once")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="switch the DB to auto_vacuum=INCREMENTAL (one full VACUUM, blocks writers)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.enable_incremental_vacuum:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+    print(json.dumps(run_maintenance(), indent=2))
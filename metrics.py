@@ -0,0 +1,111 @@
+# metrics.py — contadores/histogramas leves do pipeline, expostos em texto Prometheus
+import bisect
+import threading
+from collections import defaultdict
+from config import METRICS_ENABLED
+
+# buckets de latência em segundos (50µs .. 5s)
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+enabled = METRICS_ENABLED
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+_histograms = defaultdict(Histogram)   # (nome, labels) -> Histogram
+_counters = defaultdict(float)         # (nome, labels) -> valor
+_gauges = {}                           # nome -> função sem argumentos (lida no scrape)
+_help = {}
+_lock = threading.Lock()
+
+# O código quente testa `metrics.enabled` antes de medir; com métricas desligadas
+# o custo é um acesso a atributo por chamada.
+
+def _key(name, labels):
+    items = tuple(labels.items())
+    return (name, items if len(items) < 2 else tuple(sorted(items)))
+
+def observe(name, seconds, **labels):
+    if enabled:
+        _histograms[_key(name, labels)].observe(seconds)
+
+def inc(name, value=1, **labels):
+    if enabled:
+        _counters[_key(name, labels)] += value
+
+def register_gauge(name, fn, help_text=None):
+    """`fn()` devolve um número ou um dict {labels_tuple: número}; é lido a cada scrape."""
+    with _lock:
+        _gauges[name] = fn
+        if help_text:
+            _help[name] = help_text
+
+def describe(name, help_text):
+    _help[name] = help_text
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+def render():
+    """Texto no formato de exposição do Prometheus."""
+    lines = []
+    with _lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+    seen = set()
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+    for (name, labels), h in histograms:
+        header(name, "histogram")
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS, h.counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', repr(bound))])} {cumulative}")
+        lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {h.count}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {h.total}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {h.count}")
+    for (name, labels), value in counters:
+        header(name, "counter")
+        lines.append(f"{name}{_fmt_labels(labels)} {value:g}")
+    for name, fn in gauges:
+        try:
+            value = fn()
+        except Exception:
+            continue
+        header(name, "gauge")
+        if isinstance(value, dict):
+            for labels, v in sorted(value.items()):
+                lines.append(f"{name}{_fmt_labels(labels)} {v:g}")
+        else:
+            lines.append(f"{name} {value:g}")
+    lines.append("")
+    return "\n".join(lines)
+
+describe("valory_stage_seconds", "Latency of each pipeline stage")
+describe("valory_ticks_total", "Price ticks accepted per asset")
+describe("valory_candles_total", "Candles closed per asset and timeframe")
+describe("valory_signals_total", "Signals emitted per asset")
+describe("valory_dropped_total", "Payloads, ticks or rows dropped, by reason")
@@ -1,9 +1,23 @@
 import requests
+import abc
 import os
+import asyncio
+import logging
+import time
+import aiohttp
+import metrics
+
+LOG = logging.getLogger("notifier")
+LOG.setLevel(logging.INFO)
 
 # Pegamos TOKEN e CHAT_ID das variáveis de ambiente (Render)
-TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
+TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN") or os.environ.get("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
+TELEGRAM_API_BASE = os.environ.get("TELEGRAM_API_BASE", "https://api.telegram.org")
+NOTIFY_WEBHOOK_URL = os.environ.get("NOTIFY_WEBHOOK_URL")
+NOTIFY_PROB_THRESHOLD = float(os.environ.get("NOTIFY_PROB_THRESHOLD") or 0)
+
+HTTP_TIMEOUT = 10  # segundos
 
 def send_telegram_message(ativo, tipo, minuto_entrada, confluencias, probabilidade):
     """
@@ -13,17 +27,12 @@ def send_telegram_message(ativo, tipo, minuto_entrada, confluencias, probabilida
         print("⚠️ TOKEN ou CHAT_ID não configurado no Render.")
         return
 
-    text = (
-        f"📊 *Sinal Detectado*\n\n"
-        f"Ativo: *{ativo}*\n"
-        f"Tipo: *{tipo}*\n"
-        f"Entrada: *{minuto_entrada}*\n"
-        f"Confluências: *{confluencias}/7*\n"
-        f"Nível: *{nivel_sinal(confluencias)}*\n"
-        f"Probabilidade: *{probabilidade}%*\n"
-    )
+    text = format_signal_text({
+        "ativo": ativo, "tipo": tipo, "minuto_entrada": minuto_entrada,
+        "confluencias": confluencias, "probabilidade": probabilidade
+    })
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
+    url = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_TOKEN}/sendMessage"
 
     data = {
         "chat_id": TELEGRAM_CHAT_ID,
@@ -32,12 +41,25 @@ def send_telegram_message(ativo, tipo, minuto_entrada, confluencias, probabilida
     }
 
     try:
-        r = requests.post(url, json=data)
+        r = requests.post(url, json=data, timeout=HTTP_TIMEOUT)
         print("Telegram retorno:", r.text)
     except Exception as e:
         print("Erro enviando Telegram:", e)
 
 
+def format_signal_text(sig):
+    confluencias = sig["confluencias"]
+    return (
+        f"📊 *Sinal Detectado*\n\n"
+        f"Ativo: *{sig['ativo']}*\n"
+        f"Tipo: *{sig['tipo']}*\n"
+        f"Entrada: *{sig['minuto_entrada']}*\n"
+        f"Confluências: *{confluencias}/7*\n"
+        f"Nível: *{nivel_sinal(confluencias)}*\n"
+        f"Probabilidade: *{sig['probabilidade']}%*\n"
+    )
+
+
 def nivel_sinal(confluencias):
     """Classifica o sinal."""
     if confluencias < 3:
@@ -49,3 +71,283 @@ def nivel_sinal(confluencias):
     if confluencias == 7:
         return "Premium"
 
+
+# ===== DISPATCHER ASSÍNCRONO ===== #
+
+class RetryableError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Destination(abc.ABC):
+    """
+    Um destino de notificação com fila própria: um destino lento ou fora do
+    ar não atrasa os outros. `min_interval` é o intervalo mínimo entre envios.
+    """
+    name = "destination"
+
+    def __init__(self, min_interval=0.0, queue_size=1000):
+        self.min_interval = min_interval
+        self.queue_size = queue_size
+        self.queue = None
+        self.next_send_at = 0.0
+        self.dropped = 0
+
+    @abc.abstractmethod
+    def build_request(self, signals):
+        """Retorna (url, json) para um lote de sinais."""
+
+
+class TelegramDestination(Destination):
+    name = "telegram"
+
+    def __init__(self, token, chat_id, api_base=TELEGRAM_API_BASE, min_interval=1.0, **kw):
+        super().__init__(min_interval=min_interval, **kw)
+        self.url = f"{api_base}/bot{token}/sendMessage"
+        self.chat_id = chat_id
+
+    def build_request(self, signals):
+        # vários sinais do mesmo minuto viram uma mensagem só (limite do Telegram ~1 msg/s por chat)
+        text = "\n".join(format_signal_text(s) for s in signals)
+        return self.url, {"chat_id": self.chat_id, "text": text, "parse_mode": "Markdown"}
+
+
+class WebhookDestination(Destination):
+    name = "webhook"
+
+    def __init__(self, url, min_interval=0.0, **kw):
+        super().__init__(min_interval=min_interval, **kw)
+        self.url = url
+
+    def build_request(self, signals):
+        return self.url, {"signals": signals}
+
+
+class NotificationDispatcher:
+    """
+    Envio de sinais sem bloquear o loop de ingestão.
+
+    `notify` só enfileira (put_nowait, descarta se a fila do destino estiver
+    cheia). Para cada destino uma task junta os sinais que chegam dentro de
+    `batch_window` segundos numa única requisição, respeita `min_interval` do
+    destino e refaz a requisição com backoff exponencial em erro de rede,
+    429 ou 5xx. Todas as requisições usam uma única aiohttp.ClientSession.
+    """
+
+    def __init__(self, destinations, prob_threshold=NOTIFY_PROB_THRESHOLD, batch_window=1.0, max_batch=20,
+                 retries=3, backoff=0.5, timeout=HTTP_TIMEOUT):
+        self.destinations = list(destinations)
+        self.prob_threshold = prob_threshold
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.sent = 0
+        self.failed = 0
+        self._session = None
+        self._tasks = []
+        self._loop = None
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                              connector=aiohttp.TCPConnector(limit=10))
+        self._tasks = []
+        for dest in self.destinations:
+            dest.queue = asyncio.Queue(maxsize=dest.queue_size)
+            self._tasks.append(loop.create_task(self._run_destination(dest)))
+
+    def notify(self, signal):
+        """Enfileira o sinal para todos os destinos. Deve ser chamado dentro do loop."""
+        if not self.destinations or signal.get("probabilidade", 0) < self.prob_threshold:
+            return
+        self._ensure_started()
+        for dest in self.destinations:
+            try:
+                dest.queue.put_nowait(signal)
+            except asyncio.QueueFull:
+                dest.dropped += 1
+                metrics.inc("valory_dropped_total", reason=f"{dest.name}_queue_full")
+                LOG.warning(f"{dest.name} notification queue full, signal dropped")
+
+    async def _run_destination(self, dest):
+        while True:
+            batch = [await dest.queue.get()]
+            deadline = self._loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(dest.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            t0 = time.perf_counter()
+            try:
+                await self._send(dest, batch)
+            except Exception:
+                # erro fora do HTTP (build_request, payload não serializável): perde o lote, não a task,
+                # senão a fila do destino para de andar e drain()/close() esperam para sempre
+                LOG.exception(f"{dest.name} notification failed")
+                self.failed += 1
+            finally:
+                metrics.observe("valory_stage_seconds", time.perf_counter() - t0, stage="notify")
+                for _ in batch:
+                    dest.queue.task_done()
+
+    async def _send(self, dest, batch):
+        url, payload = dest.build_request(batch)
+        for attempt in range(self.retries + 1):
+            wait = dest.next_send_at - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            dest.next_send_at = time.monotonic() + dest.min_interval
+            try:
+                async with self._session.post(url, json=payload) as r:
+                    if r.status == 429 or r.status >= 500:
+                        retry_after = None
+                        if r.status == 429:
+                            try:
+                                retry_after = (await r.json()).get("parameters", {}).get("retry_after")
+                            except Exception:
+                                retry_after = r.headers.get("Retry-After")
+                        raise RetryableError(f"HTTP {r.status}", retry_after)
+                    if r.status >= 400:
+                        LOG.error(f"{dest.name} rejected notification: HTTP {r.status} {await r.text()}")
+                        self.failed += 1
+                        return
+                self.sent += len(batch)
+                return
+            except (aiohttp.ClientError, asyncio.TimeoutError, RetryableError) as e:
+                if attempt == self.retries:
+                    LOG.error(f"{dest.name} notification failed after {attempt + 1} attempts: {e!r}")
+                    self.failed += 1
+                    return
+                delay = self.backoff * (2 ** attempt)
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after:
+                    delay = max(delay, float(retry_after))
+                LOG.warning(f"{dest.name} notification error {e!r}, retrying in {delay:.1f}s")
+                dest.next_send_at = max(dest.next_send_at, time.monotonic() + delay)
+
+    async def drain(self):
+        """Espera as filas esvaziarem (útil em testes e no desligamento)."""
+        for dest in self.destinations:
+            if dest.queue is not None:
+                await dest.queue.join()
+
+    async def close(self):
+        await self.drain()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self._loop = None
+
+
+def default_destinations():
+    destinations = []
+    if TELEGRAM_TOKEN and TELEGRAM_CHAT_ID:
+        destinations.append(TelegramDestination(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID))
+    if NOTIFY_WEBHOOK_URL:
+        destinations.append(WebhookDestination(NOTIFY_WEBHOOK_URL))
+    return destinations
+
+
+dispatcher = NotificationDispatcher(default_destinations())
+metrics.register_gauge("valory_notify_queue_depth",
+                       lambda: {(("destination", d.name),): d.queue.qsize() for d in dispatcher.destinations if d.queue},
+                       "Signals waiting per notification destination")
+
+
+def notify_if_needed(signal):
+    """Envia o sinal (Telegram/webhook) se probabilidade >= NOTIFY_PROB_THRESHOLD."""
+    dispatcher.notify(signal)
+
+
+async def stub_check():
+    """
+    Confere o dispatcher contra um servidor HTTP local (aiohttp.web): Telegram
+    respondendo 429 (retry_after) e 503 antes de aceitar, sinais do mesmo
+    instante num lote só, e um build_request que levanta sem travar a fila.
+    """
+    from aiohttp import web
+
+    statuses = [429, 503]
+    received = {"telegram": [], "webhook": []}
+
+    async def telegram(request):
+        received["telegram"].append(await request.json())
+        status = statuses.pop(0) if statuses else 200
+        body = {"ok": status == 200}
+        if status == 429:
+            body["parameters"] = {"retry_after": 0.2}
+        return web.json_response(body, status=status)
+
+    async def webhook(request):
+        received["webhook"].append(await request.json())
+        return web.json_response({"ok": True})
+
+    class FlakyWebhook(WebhookDestination):
+        calls = 0
+
+        def build_request(self, signals):
+            self.calls += 1
+            if self.calls == 1:
+                raise ValueError("broken build_request")
+            return super().build_request(signals)
+
+    app = web.Application()
+    app.router.add_post("/botTOKEN/sendMessage", telegram)
+    app.router.add_post("/hook", webhook)
+    app.router.add_post("/flaky", webhook)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = f"http://127.0.0.1:{runner.addresses[0][1]}"
+    flaky = FlakyWebhook(f"{base}/flaky")
+    dispatcher = NotificationDispatcher(
+        [TelegramDestination("TOKEN", "1", api_base=base, min_interval=0.0), WebhookDestination(f"{base}/hook"), flaky],
+        prob_threshold=0, batch_window=0.2, backoff=0.05)
+    signal = {"ativo": "EURUSD", "tipo": "CALL", "minuto_entrada": "12:00", "confluencias": 5, "probabilidade": 80}
+    t0 = time.monotonic()
+    try:
+        for i in range(3):
+            dispatcher.notify(dict(signal, confluencias=3 + i))
+        await asyncio.wait_for(dispatcher.drain(), 10)
+        dispatcher.notify(signal)
+        await asyncio.wait_for(dispatcher.drain(), 10)
+    finally:
+        await dispatcher.close()
+        await runner.cleanup()
+    elapsed = time.monotonic() - t0
+
+    # 3 tentativas do primeiro lote (429, 503, 200) + o segundo lote
+    assert len(received["telegram"]) == 4, received["telegram"]
+    assert received["telegram"][0]["text"].count("Sinal Detectado") == 3
+    assert elapsed >= 0.2, "retry_after of the 429 was not honoured"
+    assert [len(r["signals"]) for r in received["webhook"]] == [3, 1, 1], received["webhook"]
+    assert dispatcher.failed == 1 and flaky.calls == 2
+    return {"telegram_requests": len(received["telegram"]), "webhook_requests": len(received["webhook"]),
+            "sent": dispatcher.sent, "failed": dispatcher.failed, "seconds": round(elapsed, 3)}
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Notification dispatcher tools")
+    parser.add_argument("--stub-check", action="store_true",
+                        help="exercise retries (429/5xx) and batching against a local stub HTTP server")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.stub_check:
+        print(asyncio.run(stub_check()))
+    else:
+        parser.print_help()
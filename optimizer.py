@@ -0,0 +1,144 @@
+# optimizer.py — busca em grade de períodos/pesos numa passada sobre o mesmo histórico
+import argparse
+import itertools
+import json
+import logging
+import numpy as np
+import pandas as pd
+from indicators import ema, rsi, rolling_support_resistance
+from signal_engine import vector_conditions
+from backtest import load_asset
+from config import EMA_SHORT, EMA_LONG, RSI_PERIOD, BB_PERIOD, BB_STD, WEIGHTS, MIN_CONFLUENCES
+
+LOG = logging.getLogger("optimizer")
+LOG.setLevel(logging.INFO)
+
+DEFAULT_GRID = {
+    "ema_short": [EMA_SHORT],
+    "ema_long": [EMA_LONG],
+    "rsi_period": [RSI_PERIOD],
+    "bb_period": [BB_PERIOD],
+    "bb_std": [BB_STD],
+    "weights": [WEIGHTS],
+    "min_confluences": [MIN_CONFLUENCES],
+}
+
+class PreparedFrame:
+    """
+    Colunas de um ativo calculadas uma vez por período distinto da grade (EMA,
+    RSI, média/desvio de Bollinger) mais o que não depende de parâmetro
+    (OHLC, S/R, resultado de CALL/PUT na expiração). As combinações só
+    recombinam essas colunas.
+    """
+
+    def __init__(self, df, grid, expiration_min=2, min_history=50):
+        df = df.sort_index()
+        close = df["c"]
+        n = len(df)
+        self.o, self.h, self.l, self.c = (df[k].to_numpy(dtype=float) for k in ("o", "h", "l", "c"))
+        self.ema = {p: ema(close, p).to_numpy() for p in sorted(set(grid["ema_short"]) | set(grid["ema_long"]))}
+        self.rsi = {p: rsi(close, p).to_numpy() for p in grid["rsi_period"]}
+        self.bb = {p: (close.rolling(p).mean().to_numpy(), close.rolling(p).std().to_numpy()) for p in grid["bb_period"]}
+        support, resistance = rolling_support_resistance(df["h"], df["l"], lookback=50)
+        self.support, self.resistance = support.to_numpy(), resistance.to_numpy()
+        self.vol_flag = np.zeros(n, dtype=bool)  # como em backtest.simulate (sem proxy de volume)
+
+        # mesmas barras e mesmo resultado de backtest.simulate_vectorized
+        price_out = np.full(n, np.nan)
+        price_out[:n - expiration_min] = self.c[expiration_min:]
+        self.rows = slice(min_history, max(min_history, n - expiration_min))
+        self.call_win = (price_out > self.c)[self.rows]
+        self.put_win = (price_out < self.c)[self.rows]
+
+    def conditions(self, ema_short, ema_long, rsi_period, bb_period, bb_std):
+        ma, sd = self.bb[bb_period]
+        r = self.rows
+        return vector_conditions(self.o[r], self.h[r], self.l[r], self.c[r], self.ema[ema_short][r],
+                                 self.ema[ema_long][r], self.rsi[rsi_period][r], (ma + bb_std * sd)[r],
+                                 (ma - bb_std * sd)[r], self.vol_flag[r], self.support[r], self.resistance[r])
+
+def _weight_matrix(conds, weight_sets):
+    # uma coluna por conjunto de pesos, com o mesmo fallback de score_frame (1/len)
+    return {k: np.array([w.get(k, 1.0 / len(conds)) for w in weight_sets]) for k in conds}
+
+def _side_scores(conds, weight_sets):
+    """(confluências por barra, probabilidade barras x conjuntos de pesos), somando na ordem de score_frame."""
+    wm = _weight_matrix(conds, weight_sets)
+    confluencias = 0
+    score = 0.0
+    for k, v in conds.items():
+        v = np.asarray(v, dtype=np.int64)
+        confluencias = confluencias + v
+        score = score + wm[k][None, :] * v[:, None]
+    return confluencias, score * 100
+
+def grid_search(frames, grid=None, expiration_min=2, min_history=50):
+    """
+    Avalia todas as combinações de `grid` (chaves de DEFAULT_GRID; listas de
+    valores; "weights" é uma lista de dicts) sobre os mesmos candles. Para cada
+    combinação de períodos as condições são montadas uma vez; todos os
+    conjuntos de pesos e mínimos de confluência são pontuados juntos, em arrays
+    barras x pesos. Retorna um DataFrame ordenado por win_rate e sinais.
+    """
+    grid = {**DEFAULT_GRID, **(grid or {})}
+    weight_sets = list(grid["weights"])
+    prepared = [PreparedFrame(df, grid, expiration_min, min_history) for _, df in frames]
+    combos = [c for c in itertools.product(grid["ema_short"], grid["ema_long"], grid["rsi_period"],
+                                           grid["bb_period"], grid["bb_std"]) if c[0] < c[1]]
+    LOG.info(f"{len(combos)} indicator combos x {len(weight_sets)} weight sets x "
+             f"{len(grid['min_confluences'])} thresholds over {len(prepared)} assets")
+    rows = []
+    for combo in combos:
+        signals = {mc: np.zeros(len(weight_sets), dtype=np.int64) for mc in grid["min_confluences"]}
+        wins = {mc: np.zeros(len(weight_sets), dtype=np.int64) for mc in grid["min_confluences"]}
+        for pf in prepared:
+            call, put = pf.conditions(*combo)
+            call_conf, call_prob = _side_scores(call, weight_sets)
+            put_conf, put_prob = _side_scores(put, weight_sets)
+            for mc in grid["min_confluences"]:
+                # mesma escolha de candidato de build_signal/score_frame
+                call_ok = (call_conf >= mc)[:, None]
+                put_ok = (put_conf >= mc)[:, None] & (~call_ok | (put_prob > call_prob))
+                call_sig = call_ok & ~put_ok
+                signals[mc] += call_sig.sum(axis=0) + put_ok.sum(axis=0)
+                wins[mc] += (call_sig & pf.call_win[:, None]).sum(axis=0) + (put_ok & pf.put_win[:, None]).sum(axis=0)
+        for mc in grid["min_confluences"]:
+            for wi in range(len(weight_sets)):
+                n_sig = int(signals[mc][wi])
+                rows.append({"ema_short": combo[0], "ema_long": combo[1], "rsi_period": combo[2],
+                             "bb_period": combo[3], "bb_std": combo[4], "weights": wi, "min_confluences": mc,
+                             "signals": n_sig, "wins": int(wins[mc][wi]),
+                             "win_rate": float(wins[mc][wi]) / n_sig * 100 if n_sig else float("nan")})
+    result = pd.DataFrame(rows)
+    if result.empty:
+        return result
+    return result.sort_values(["win_rate", "signals"], ascending=False, na_position="last").reset_index(drop=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank indicator periods/weights/min confluences by backtest win rate")
+    parser.add_argument("--assets", nargs="+", required=True)
+    parser.add_argument("--grid", default=None, help="JSON file with lists for any of: " + ", ".join(DEFAULT_GRID))
+    parser.add_argument("--csv_map", default=None, help="optional mapping JSON file with asset->csvpath")
+    parser.add_argument("--archive", default=None)
+    parser.add_argument("--start", default=None)
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--expiration", type=int, default=2)
+    parser.add_argument("--min-signals", type=int, default=30, help="hide combos with fewer signals")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--out", default="grid_results.csv")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    grid = json.load(open(args.grid)) if args.grid else None
+    csv_map = json.load(open(args.csv_map)) if args.csv_map else None
+    frames = []
+    for asset in args.assets:
+        df = load_asset(asset, csv_map, args.start, args.end, args.archive)
+        if df is None or df.empty:
+            LOG.warning(f"No data for {asset}")
+            continue
+        frames.append((asset, df))
+    ranked = grid_search(frames, grid, expiration_min=args.expiration)
+    ranked = ranked[ranked["signals"] >= args.min_signals] if not ranked.empty else ranked
+    ranked.to_csv(args.out, index=False)
+    LOG.info(f"Grid results saved to {args.out}")
+    print(ranked.head(args.top).to_string(index=False))
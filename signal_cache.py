@@ -0,0 +1,114 @@
+# signal_cache.py — cache em memória dos sinais para /signals/current e /signals/history
+import heapq
+import itertools
+import threading
+import time
+from collections import deque, defaultdict
+import pandas as pd
+from sqlalchemy import text
+from db import SessionLocal, Signal
+from aggregator import timeframe_minutes
+from config import SIGNAL_CACHE_TOP, SIGNAL_CACHE_HISTORY
+
+SIGNAL_FIELDS = ("id", "timestamp", "ativo", "minuto_entrada", "tipo", "confluencias",
+                 "probabilidade", "detalhes", "expiracao_sugerida_min", "timeframe")
+
+def _epoch(value):
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return ts.timestamp()
+
+def _valid_until(signal):
+    return _epoch(signal["minuto_entrada"]) + timeframe_minutes(signal.get("timeframe") or "1m") * 60
+
+def signal_to_dict(row):
+    """Linha ORM Signal -> dict no mesmo formato dos sinais do ingest."""
+    return {k: getattr(row, k) for k in SIGNAL_FIELDS}
+
+class SignalCache:
+    """
+    Sinais recentes em memória, alimentados pelo pipeline de ingestão:
+    - anel com os últimos `history_size` sinais (mais novo no fim);
+    - min-heaps limitados com os `top_size` maiores `probabilidade`, global e por ativo.
+    Leituras não tocam o SQLite; só histórico além do anel vai ao banco.
+    """
+
+    def __init__(self, top_size=SIGNAL_CACHE_TOP, history_size=SIGNAL_CACHE_HISTORY):
+        self.top_size = top_size
+        self.history_size = history_size
+        self._recent = deque(maxlen=history_size)
+        self._top = []
+        self._top_by_asset = defaultdict(list)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def add(self, signal):
+        entry = (float(signal["probabilidade"]), next(self._seq), signal)
+        with self._lock:
+            self._recent.append(signal)
+            self._push(self._top, entry)
+            self._push(self._top_by_asset[signal["ativo"]], entry)
+
+    def _push(self, heap, entry):
+        if len(heap) < self.top_size:
+            heapq.heappush(heap, entry)
+        elif entry[0] > heap[0][0]:
+            heapq.heapreplace(heap, entry)
+
+    def top(self, n, asset=None, valid_only=False, now=None):
+        """
+        Os `n` sinais de maior probabilidade. Com valid_only, só os que ainda
+        estão no candle de entrada (minuto_entrada + duração do timeframe do
+        sinal); esses estão todos no anel recente.
+        Retorna None se o cache não tem como responder (n > top_size).
+        """
+        with self._lock:
+            if not self.loaded:
+                return None
+            if valid_only:
+                now = time.time() if now is None else now
+                pool = [s for s in self._recent
+                        if (asset is None or s["ativo"] == asset) and _valid_until(s) > now]
+                return heapq.nlargest(n, pool, key=lambda s: float(s["probabilidade"]))
+            if n > self.top_size:
+                return None
+            heap = self._top if asset is None else self._top_by_asset.get(asset, [])
+            return [e[2] for e in heapq.nlargest(n, heap)]
+
+    def history(self, limit, asset=None):
+        """Últimos `limit` sinais (mais novo primeiro), ou None se o anel não cobre o pedido."""
+        with self._lock:
+            if not self.loaded:
+                return None
+            if asset is None:
+                if limit > len(self._recent) and len(self._recent) == self.history_size:
+                    return None
+                return list(itertools.islice(reversed(self._recent), limit))
+            out = [s for s in reversed(self._recent) if s["ativo"] == asset][:limit]
+            if len(out) < limit and len(self._recent) == self.history_size:
+                return None
+            return out
+
+    def load_from_db(self):
+        """Semeia o cache com o histórico recente e os tops do banco (uma vez, na subida da API)."""
+        with SessionLocal() as db:
+            recent = db.query(Signal).order_by(Signal.timestamp.desc()).limit(self.history_size).all()
+            top = db.query(Signal).order_by(Signal.probabilidade.desc()).limit(self.top_size).all()
+            by_asset = db.query(Signal).from_statement(text(
+                "SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY ativo ORDER BY probabilidade DESC) AS rn "
+                "FROM signals) WHERE rn <= :k")).params(k=self.top_size).all()
+            recent, top, by_asset = ([signal_to_dict(r) for r in rows] for rows in (recent, top, by_asset))
+        with self._lock:
+            self._recent.clear()
+            self._recent.extend(reversed(recent))
+            self._top = []
+            self._top_by_asset = defaultdict(list)
+            for s in top:
+                self._push(self._top, (float(s["probabilidade"]), next(self._seq), s))
+            for s in by_asset:
+                self._push(self._top_by_asset[s["ativo"]], (float(s["probabilidade"]), next(self._seq), s))
+            self.loaded = True
+
+signal_cache = SignalCache()
@@ -1,27 +1,21 @@
 # signal_engine.py
-from indicators import ema, rsi, bollinger_bands, detect_hammer, detect_shooting_star, is_bollinger_touch, calc_support_resistance
+from indicators import (ema, rsi, bollinger_bands, detect_hammer, detect_shooting_star, is_bollinger_touch, calc_support_resistance,
+                        hammer_mask, shooting_star_mask, bollinger_touch_masks, rolling_support_resistance)
+import numpy as np
 import pandas as pd
-from config import WEIGHTS, MIN_CONFLUENCES
+from config import WEIGHTS, MIN_CONFLUENCES, EMA_SHORT, EMA_LONG, RSI_PERIOD, BB_PERIOD, BB_STD
+from aggregator import timeframe_minutes
+from indicator_cache import frame_fingerprint
 
 def evaluate_signal(ohlcv_df: pd.DataFrame, asset: str, volume_proxy_series=None):
-    out = {}
     close = ohlcv_df['c']
-    ema9 = ema(close, 9)
-    ema21 = ema(close, 21)
-    rsi14 = rsi(close, 14)
-    upper, mid, lower = bollinger_bands(close, 20, 2)
+    ema9 = ema(close, EMA_SHORT)
+    ema21 = ema(close, EMA_LONG)
+    rsi14 = rsi(close, RSI_PERIOD)
+    upper, mid, lower = bollinger_bands(close, BB_PERIOD, BB_STD)
     last_idx = ohlcv_df.index[-1]
     last_row = ohlcv_df.iloc[-1]
-    price = last_row['c']
-
-    price_above_emas = 1 if price > ema9.iloc[-1] and price > ema21.iloc[-1] else 0
-    rsi_val = rsi14.iloc[-1]
-    rsi_call = 1 if (30 <= rsi_val <= 50) else 0
-    rsi_put  = 1 if (50 <= rsi_val <= 70) else 0
-    bb_touch = is_bollinger_touch(price, upper.iloc[-1], lower.iloc[-1])
     candle = {'o': last_row['o'],'h': last_row['h'],'l': last_row['l'],'c': last_row['c']}
-    hammer = detect_hammer(candle)
-    shooting = detect_shooting_star(candle)
 
     vol_flag = 0
     if volume_proxy_series is not None and len(volume_proxy_series)>1:
@@ -29,11 +23,274 @@ def evaluate_signal(ohlcv_df: pd.DataFrame, asset: str, volume_proxy_series=None
             vol_flag = 1
 
     support, resistance = calc_support_resistance(ohlcv_df['h'].tolist(), ohlcv_df['l'].tolist(), lookback=50)
+    call_conditions, put_conditions = build_conditions(
+        candle, ema9.iloc[-1], ema21.iloc[-1], rsi14.iloc[-1], upper.iloc[-1], lower.iloc[-1],
+        vol_flag, support, resistance)
+    return build_signal(asset, last_idx, call_conditions, put_conditions)
+
+def evaluate_state(state, asset: str, use_volume=True, timeframe="1m"):
+    """
+    Mesmo resultado de evaluate_signal, mas a partir de um indicators.IndicatorState
+    já atualizado com o último candle fechado (O(1) por candle).
+    """
+    if state.last is None:
+        return None
+    vol_flag = 0
+    if use_volume and state.prev_v is not None and state.last['v'] > state.prev_v:
+        vol_flag = 1
+    upper, mid, lower = state.bollinger()
+    support, resistance = state.support_resistance()
+    call_conditions, put_conditions = build_conditions(
+        state.last, state.ema_s, state.ema_l, state.rsi(), upper, lower,
+        vol_flag, support, resistance)
+    return build_signal(asset, pd.Timestamp(state.timestamp), call_conditions, put_conditions, timeframe=timeframe)
+
+def evaluate_frame(ohlcv_df: pd.DataFrame, volume_proxy_series=None, cache=None, asset=None):
+    """
+    Versão vetorizada de evaluate_signal: calcula as condições CALL/PUT, as
+    confluências, a probabilidade e o sinal escolhido para todas as barras de
+    uma vez. A linha i é igual ao que evaluate_signal(ohlcv_df.iloc[:i+1]) daria.
+
+    Retorna um DataFrame com o mesmo índice e colunas call_<cond>, put_<cond>,
+    call_confluencias, put_confluencias, call_probability, put_probability,
+    tipo (None quando não há sinal), confluencias e probability.
+    Com `cache` (indicator_cache.IndicatorCache) as séries dos indicadores são
+    reaproveitadas entre execuções sobre os mesmos candles.
+    """
+    ind = frame_indicators(ohlcv_df, cache=cache, asset=asset)
+    o, h, l, c = (ohlcv_df[k].to_numpy(dtype=float) for k in ('o', 'h', 'l', 'c'))
+
+    vol_flag = np.zeros(len(c), dtype=bool)
+    if volume_proxy_series is not None and len(volume_proxy_series) > 1:
+        vol = np.asarray(volume_proxy_series, dtype=float)
+        vol_flag[1:] = vol[1:] > vol[:-1]
+
+    call_conditions, put_conditions = vector_conditions(o, h, l, c, ind['ema_s'], ind['ema_l'], ind['rsi'],
+                                                        ind['upper'], ind['lower'], vol_flag,
+                                                        ind['support'], ind['resistance'])
+    return score_frame(ohlcv_df.index, call_conditions, put_conditions)
+
+def frame_indicators(ohlcv_df: pd.DataFrame, cache=None, asset=None):
+    """Séries de evaluate_frame: ema_s, ema_l, rsi, upper, lower, support, resistance (arrays)."""
+    close = ohlcv_df['c']
+
+    def bands():
+        upper, mid, lower = bollinger_bands(close, BB_PERIOD, BB_STD)
+        return np.vstack([upper.to_numpy(), lower.to_numpy()])
+
+    def sr():
+        support, resistance = rolling_support_resistance(ohlcv_df['h'], ohlcv_df['l'], lookback=50)
+        return np.vstack([support.to_numpy(), resistance.to_numpy()])
+
+    specs = {
+        'ema_s': ("ema", {"period": EMA_SHORT}, lambda: ema(close, EMA_SHORT).to_numpy()),
+        'ema_l': ("ema", {"period": EMA_LONG}, lambda: ema(close, EMA_LONG).to_numpy()),
+        'rsi': ("rsi", {"period": RSI_PERIOD}, lambda: rsi(close, RSI_PERIOD).to_numpy()),
+        'bands': ("bollinger", {"period": BB_PERIOD, "std": BB_STD}, bands),
+        'sr': ("support_resistance", {"lookback": 50}, sr),
+    }
+    if cache is None:
+        values = {k: fn() for k, (_, _, fn) in specs.items()}
+    else:
+        fp = frame_fingerprint(ohlcv_df)
+        values = {k: cache.series(asset, fp, name, params, fn) for k, (name, params, fn) in specs.items()}
+    return {'ema_s': values['ema_s'], 'ema_l': values['ema_l'], 'rsi': values['rsi'],
+            'upper': values['bands'][0], 'lower': values['bands'][1],
+            'support': values['sr'][0], 'resistance': values['sr'][1]}
+
+def vector_conditions(o, h, l, c, ema_s, ema_l, rsi_val, upper, lower, vol_flag, support, resistance):
+    """build_conditions sobre arrays (uma posição por barra ou por ativo)."""
+    touch_upper, touch_lower = bollinger_touch_masks(c, upper, lower)
+    price_above_emas = (c > ema_s) & (c > ema_l)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sr_support = np.abs(c - support)/support < 0.005
+        sr_res = np.abs(c - resistance)/resistance < 0.005
+
+    call_conditions = {
+        'ema': ema_s > ema_l,
+        'price_above_emas': price_above_emas,
+        'rsi_zone': (30 <= rsi_val) & (rsi_val <= 50),
+        'bollinger_touch': touch_lower,
+        'candle_pattern': hammer_mask(o, h, l, c),
+        'volume': vol_flag,
+        'sr': sr_support
+    }
+    put_conditions = {
+        'ema': ema_s < ema_l,
+        'price_below_emas': ~price_above_emas,
+        'rsi_zone': (50 <= rsi_val) & (rsi_val <= 70),
+        'bollinger_touch': touch_upper,
+        'candle_pattern': shooting_star_mask(o, h, l, c),
+        'volume': vol_flag,
+        'sr': sr_res
+    }
+    return call_conditions, put_conditions
+
+def evaluate_batch(assets, ts, o, h, l, c, v=None, timeframe="1m"):
+    """
+    Avalia a última barra de vários ativos de uma vez. o/h/l/c/v são arrays
+    2D (ativos x barras), alinhados à direita; ativos com menos histórico vêm
+    com NaN à esquerda (ver candle_ring.stack_rings). `ts` tem o timestamp
+    (ns UTC) da última barra de cada ativo. Retorna a lista de sinais, no
+    mesmo formato de evaluate_signal.
+    """
+    o, h, l, c = (np.asarray(x, dtype=float) for x in (o, h, l, c))
+    n_assets, n_bars = c.shape
+    if n_assets == 0 or n_bars == 0:
+        return []
+    nan = np.full(n_assets, np.nan)
+
+    # EMA: repetir o primeiro valor válido no lugar do NaN não muda a EMA (y0 = x0); a soma é
+    # feita sobre x - x0 para que série constante dê exatamente x0 nos dois períodos, como a
+    # recursão de evaluate_state (senão o ruído de ponto flutuante decide ema_s > ema_l)
+    has_bars = ~np.isnan(c).all(axis=1)
+    first_valid = np.argmax(~np.isnan(c), axis=1)
+    x0 = c[np.arange(n_assets), first_valid]
+    c_filled = np.where(np.arange(n_bars) < first_valid[:, None], x0[:, None], c) - x0[:, None]
+    ema_s = x0 + _ema_weights(n_bars, EMA_SHORT) @ c_filled.T
+    ema_l = x0 + _ema_weights(n_bars, EMA_LONG) @ c_filled.T
+
+    if n_bars > RSI_PERIOD:
+        delta = np.diff(c[:, -(RSI_PERIOD + 1):], axis=1)
+        rs = delta.clip(min=0).mean(axis=1) / (-delta.clip(max=0).mean(axis=1) + 1e-9)
+        rsi_val = 100 - (100 / (1 + rs))
+    else:
+        rsi_val = nan
+    if n_bars >= BB_PERIOD:
+        window = c[:, -BB_PERIOD:]
+        ma = window.mean(axis=1)
+        sd = window.std(axis=1, ddof=1)
+        upper, lower = ma + BB_STD*sd, ma - BB_STD*sd
+    else:
+        upper = lower = nan
+    with np.errstate(invalid='ignore'):
+        support = np.nanmin(l[:, -50:], axis=1)
+        resistance = np.nanmax(h[:, -50:], axis=1)
+    if v is not None and n_bars > 1:
+        v = np.asarray(v, dtype=float)
+        vol_flag = v[:, -1] > v[:, -2]
+    else:
+        vol_flag = np.zeros(n_assets, dtype=bool)
+
+    call_conditions, put_conditions = vector_conditions(o[:, -1], h[:, -1], l[:, -1], c[:, -1], ema_s, ema_l,
+                                                        rsi_val, upper, lower, vol_flag, support, resistance)
+    scored = score_arrays(call_conditions, put_conditions)
+    tf_min = timeframe_minutes(timeframe)
+    now = pd.Timestamp.utcnow().isoformat()
+    ts = np.asarray(ts).view("int64")
+    tipos = scored['tipo']
+    confl = scored['confluencias']
+    probs = scored['probability']
+    cols = {side: {k: scored[f"{side}_{k}"] for k in conds}
+            for side, conds in (("call", call_conditions), ("put", put_conditions))}
+    signals = []
+    # ativo sem nenhuma barra no ring: sem sinal, como evaluate_state (state.last None)
+    for i in np.flatnonzero(np.not_equal(tipos, None) & has_bars):
+        side = "call" if tipos[i] == "CALL" else "put"
+        signals.append({
+            "timestamp": now,
+            "ativo": assets[i],
+            "minuto_entrada": (pd.Timestamp(int(ts[i]), tz="UTC") + pd.Timedelta(minutes=tf_min)).isoformat(),
+            "tipo": tipos[i],
+            "confluencias": int(confl[i]),
+            "probabilidade": round(float(probs[i]), 2),
+            "detalhes": {k: int(v[i]) for k, v in cols[side].items()},
+            "expiracao_sugerida_min": 2 * tf_min,
+            "timeframe": timeframe
+        })
+    return signals
+
+def score_frame(index, call_conditions, put_conditions, weights=None, min_confluences=None):
+    """score_arrays num DataFrame com `index`."""
+    return pd.DataFrame(score_arrays(call_conditions, put_conditions, weights, min_confluences), index=index)
+
+def score_arrays(call_conditions, put_conditions, weights=None, min_confluences=None):
+    """score_and_build + escolha do candidato de build_signal, em arrays (dict coluna -> array)."""
+    weights = WEIGHTS if weights is None else weights
+    min_confluences = MIN_CONFLUENCES if min_confluences is None else min_confluences
+    out = {}
+    for side, conds in (("call", call_conditions), ("put", put_conditions)):
+        confluencias = 0
+        score = 0.0
+        for k, v in conds.items():
+            v = np.asarray(v, dtype=np.int64)
+            out[f"{side}_{k}"] = v
+            w = weights.get(k, 1.0/len(conds))
+            confluencias = confluencias + v
+            score = score + w * v
+        out[f"{side}_confluencias"] = confluencias
+        out[f"{side}_probability"] = score * 100
+
+    call_ok = out["call_confluencias"] >= min_confluences
+    put_ok = (out["put_confluencias"] >= min_confluences) & (~call_ok | (out["put_probability"] > out["call_probability"]))
+    tipo = np.where(put_ok, "PUT", np.where(call_ok, "CALL", None))
+    out["tipo"] = tipo
+    out["confluencias"] = np.where(put_ok, out["put_confluencias"], out["call_confluencias"])
+    out["probability"] = np.where(put_ok, out["put_probability"], out["call_probability"])
+    return out
+
+def _ema_weights(n_bars, period):
+    # último valor de ewm(span=period, adjust=False): y = (1-a)^n x0 + sum a (1-a)^(n-k) x_k
+    a = 2.0 / (period + 1)
+    decay = (1 - a) ** np.arange(n_bars - 1, -1, -1, dtype=float)
+    weights = a * decay
+    weights[0] = decay[0]
+    return weights
+
+def _ema_last(x, period):
+    # centrado em x0 pelo mesmo motivo de evaluate_batch
+    return float(x[0] + np.dot(_ema_weights(len(x), period), x - x[0]))
+
+def evaluate_arrays(asset, ts, o, h, l, c, v=None, timeframe="1m"):
+    """
+    evaluate_signal direto sobre arrays NumPy (ex.: views de candle_ring.CandleRing),
+    sem montar DataFrame: só o último valor de cada indicador é calculado.
+    `ts` em ns UTC (int64 ou datetime64[ns]).
+    """
+    n = len(c)
+    if n == 0:
+        return None
+    c = np.asarray(c, dtype=float)
+    nan = float('nan')
+    ema_s = _ema_last(c, EMA_SHORT)
+    ema_l = _ema_last(c, EMA_LONG)
+    if n > RSI_PERIOD:
+        delta = np.diff(c[-(RSI_PERIOD + 1):])
+        rs = delta.clip(min=0).mean() / (-delta.clip(max=0).mean() + 1e-9)
+        rsi_val = 100 - (100 / (1 + rs))
+    else:
+        rsi_val = nan
+    if n >= BB_PERIOD:
+        window = c[-BB_PERIOD:]
+        ma = window.mean()
+        sd = window.std(ddof=1)
+        upper, lower = ma + BB_STD*sd, ma - BB_STD*sd
+    else:
+        upper = lower = nan
+    support = float(np.min(l[-50:]))
+    resistance = float(np.max(h[-50:]))
+    vol_flag = 1 if v is not None and n > 1 and v[-1] > v[-2] else 0
+    candle = {'o': float(o[-1]), 'h': float(h[-1]), 'l': float(l[-1]), 'c': float(c[-1])}
+    call_conditions, put_conditions = build_conditions(candle, ema_s, ema_l, rsi_val, upper, lower,
+                                                       vol_flag, support, resistance)
+    last_idx = pd.Timestamp(np.asarray(ts)[-1].view("int64"), tz="UTC")
+    return build_signal(asset, last_idx, call_conditions, put_conditions, timeframe=timeframe)
+
+def build_conditions(candle, ema_short, ema_long, rsi_val, upper, lower, vol_flag, support, resistance):
+    price = candle['c']
+    price_above_emas = 1 if price > ema_short and price > ema_long else 0
+    rsi_call = 1 if (30 <= rsi_val <= 50) else 0
+    rsi_put  = 1 if (50 <= rsi_val <= 70) else 0
+    bb_touch = is_bollinger_touch(price, upper, lower)
+    hammer = detect_hammer(candle)
+    shooting = detect_shooting_star(candle)
+
     sr_flag_support = 1 if support is not None and abs(price - support)/support < 0.005 else 0
     sr_flag_res = 1 if resistance is not None and abs(price - resistance)/resistance < 0.005 else 0
 
     call_conditions = {
-        'ema': 1 if (ema9.iloc[-1] > ema21.iloc[-1]) else 0,
+        'ema': 1 if (ema_short > ema_long) else 0,
         'price_above_emas': price_above_emas,
         'rsi_zone': rsi_call,
         'bollinger_touch': 1 if bb_touch=='lower' else 0,
@@ -42,7 +299,7 @@ def evaluate_signal(ohlcv_df: pd.DataFrame, asset: str, volume_proxy_series=None
         'sr': sr_flag_support
     }
     put_conditions = {
-        'ema': 1 if (ema9.iloc[-1] < ema21.iloc[-1]) else 0,
+        'ema': 1 if (ema_short < ema_long) else 0,
         'price_below_emas': 1 if not price_above_emas else 0,
         'rsi_zone': rsi_put,
         'bollinger_touch': 1 if bb_touch=='upper' else 0,
@@ -50,22 +307,24 @@ def evaluate_signal(ohlcv_df: pd.DataFrame, asset: str, volume_proxy_series=None
         'volume': vol_flag,
         'sr': sr_flag_res
     }
+    return call_conditions, put_conditions
 
-    def score_and_build(conds):
-        confluencias = sum(conds.values())
-        score = 0.0
-        # map weights by cond name; fallback uniform for unknowns
-        for k,v in conds.items():
-            w = WEIGHTS.get(k, 1.0/len(conds))
-            score += w * float(v)
-        prob = score * 100
-        return {
-            "confluencias": int(confluencias),
-            "score": float(score),
-            "probability": float(prob),
-            "details": conds
-        }
+def score_and_build(conds):
+    confluencias = sum(conds.values())
+    score = 0.0
+    # map weights by cond name; fallback uniform for unknowns
+    for k,v in conds.items():
+        w = WEIGHTS.get(k, 1.0/len(conds))
+        score += w * float(v)
+    prob = score * 100
+    return {
+        "confluencias": int(confluencias),
+        "score": float(score),
+        "probability": float(prob),
+        "details": conds
+    }
 
+def build_signal(asset, last_idx, call_conditions, put_conditions, timeframe="1m"):
     call_res = score_and_build(call_conditions)
     put_res = score_and_build(put_conditions)
 
@@ -77,15 +336,17 @@ def evaluate_signal(ohlcv_df: pd.DataFrame, asset: str, volume_proxy_series=None
 
     if candidate:
         tipo, data = candidate
+        tf_min = timeframe_minutes(timeframe)
         signal = {
             "timestamp": pd.Timestamp.utcnow().isoformat(),
             "ativo": asset,
-            "minuto_entrada": (last_idx + pd.Timedelta(minutes=1)).isoformat(),
+            "minuto_entrada": (last_idx + pd.Timedelta(minutes=tf_min)).isoformat(),
             "tipo": tipo,
             "confluencias": int(data['confluencias']),
             "probabilidade": round(data['probability'],2),
             "detalhes": data['details'],
-            "expiracao_sugerida_min": 2
+            "expiracao_sugerida_min": 2 * tf_min,
+            "timeframe": timeframe
         }
         return signal
     return None
@@ -0,0 +1,96 @@
+# signal_hub.py — distribuição dos sinais do ingest para clientes SSE/WebSocket
+import asyncio
+import logging
+import threading
+from collections import deque
+import metrics
+
+LOG = logging.getLogger("signal_hub")
+LOG.setLevel(logging.INFO)
+
+class Subscriber:
+    """Fila de um cliente conectado. Cheia = cliente lento: descarta o sinal mais antigo."""
+
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.closed = False
+
+    def push(self, signal, max_dropped):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            if self.dropped > max_dropped:
+                # não acompanha o fluxo: desconecta, o cliente reconecta e recebe o snapshot
+                self.closed = True
+        self.queue.put_nowait(signal)
+
+    async def get(self):
+        return await self.queue.get()
+
+class SignalHub:
+    """
+    Recebe sinais do loop de ingestão (outra thread) e repassa para todos os
+    clientes conectados no loop da API. Cada cliente tem uma fila limitada;
+    quem conecta recebe primeiro o snapshot: `snapshot_source(snapshot_size)`
+    quando definido (a API usa os tops do signal_cache, que vêm do banco na
+    subida), senão os últimos `snapshot_size` sinais publicados.
+    """
+
+    def __init__(self, snapshot_size=50, client_queue_size=100, max_dropped=500):
+        self.snapshot_size = snapshot_size
+        self.snapshot_source = None  # fn(n) -> lista na ordem de exibição, ou None
+        self.client_queue_size = client_queue_size
+        self.max_dropped = max_dropped
+        self._recent = deque(maxlen=snapshot_size)
+        self._subscribers = set()
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def attach_loop(self, loop):
+        """Loop onde vivem os clientes (o do uvicorn)."""
+        self._loop = loop
+
+    def publish(self, signal):
+        """Pode ser chamado de qualquer thread."""
+        with self._lock:
+            self._recent.append(signal)
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fanout(signal)
+        else:
+            loop.call_soon_threadsafe(self._fanout, signal)
+
+    def _fanout(self, signal):
+        for sub in list(self._subscribers):
+            sub.push(signal, self.max_dropped)
+
+    def snapshot(self):
+        if self.snapshot_source is not None:
+            seeded = self.snapshot_source(self.snapshot_size)
+            if seeded is not None:
+                return list(seeded)
+        with self._lock:
+            return list(reversed(self._recent))
+
+    def subscribe(self):
+        """Retorna (subscriber, snapshot). Chamar dentro do loop anexado."""
+        sub = Subscriber(self.client_queue_size)
+        self._subscribers.add(sub)
+        return sub, self.snapshot()
+
+    def unsubscribe(self, sub):
+        self._subscribers.discard(sub)
+
+    @property
+    def client_count(self):
+        return len(self._subscribers)
+
+hub = SignalHub()
+metrics.register_gauge("valory_stream_clients", lambda: hub.client_count, "Connected SSE/WebSocket clients")
@@ -0,0 +1,88 @@
+# signal_store.py — histórico de sinais paginado por cursor (keyset) e exportação em streaming
+import base64
+import csv
+import io
+import json
+from sqlalchemy import select, and_, or_
+from db import engine, Signal
+from candle_store import to_db_time
+from signal_cache import SIGNAL_FIELDS
+
+try:
+    import orjson
+except ImportError:  # opcional: só deixa a exportação mais rápida
+    orjson = None
+
+def encode_cursor(row):
+    """Cursor opaco = posição (timestamp, id) da última linha entregue."""
+    raw = json.dumps([row["timestamp"].isoformat(), row["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        ts, sid = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return to_db_time(ts), int(sid)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+def signal_query(asset=None, tipo=None, min_confluences=None, start=None, end=None, cursor=None, limit=None):
+    """
+    SELECT dos sinais do mais novo para o mais antigo, ordenado por (timestamp, id)
+    — a ordem dos índices ix_signals_*: cada página continua depois do cursor
+    sem OFFSET nem reordenar a tabela. Filtros: ativo, tipo, confluências mínimas, [start, end).
+    """
+    t = Signal.__table__
+    q = select(*[t.c[k] for k in SIGNAL_FIELDS])
+    if asset:
+        q = q.where(t.c.ativo == asset)
+    if tipo:
+        q = q.where(t.c.tipo == tipo.upper())
+    if min_confluences is not None:
+        q = q.where(t.c.confluencias >= min_confluences)
+    if start is not None:
+        q = q.where(t.c.timestamp >= to_db_time(start))
+    if end is not None:
+        q = q.where(t.c.timestamp < to_db_time(end))
+    if cursor:
+        ts, sid = decode_cursor(cursor)
+        q = q.where(or_(t.c.timestamp < ts, and_(t.c.timestamp == ts, t.c.id < sid)))
+    q = q.order_by(t.c.timestamp.desc(), t.c.id.desc())
+    if limit is not None:
+        q = q.limit(limit)
+    return q
+
+def page_signals(limit=100, **filters):
+    """(sinais, próximo cursor ou None) de uma página."""
+    with engine.connect() as conn:
+        rows = [dict(r._mapping) for r in conn.execute(signal_query(limit=limit + 1, **filters))]
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def iter_signals(chunk_size=2000, **filters):
+    """Gera lotes de sinais (dicts) sem carregar o resultado inteiro."""
+    q = signal_query(**filters)
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(q)
+        for rows in result.partitions():
+            yield [dict(r._mapping) for r in rows]
+
+def _default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"not JSON serializable: {type(value)}")
+
+def ndjson_lines(rows):
+    """Uma linha JSON por sinal (bytes); usa orjson quando instalado."""
+    if orjson is not None:
+        return b"".join(orjson.dumps(r, default=_default, option=orjson.OPT_APPEND_NEWLINE) for r in rows)
+    return "".join(json.dumps(r, default=_default, separators=(",", ":")) + "\n" for r in rows).encode()
+
+def csv_lines(rows, header=False):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    if header:
+        w.writerow(SIGNAL_FIELDS)
+    for r in rows:
+        w.writerow([json.dumps(r[k], separators=(",", ":")) if k == "detalhes" else
+                    (r[k].isoformat() if hasattr(r[k], "isoformat") else r[k]) for k in SIGNAL_FIELDS])
+    return buf.getvalue().encode()
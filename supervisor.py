@@ -0,0 +1,158 @@
+# supervisor.py — ingestão dividida em processos por partição de ativos
+import asyncio
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import time
+import zlib
+from config import MONITORED_ASSETS, INGEST_WORKERS, HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT
+
+LOG = logging.getLogger("supervisor")
+LOG.setLevel(logging.INFO)
+
+def partition_assets(assets, n):
+    """Divide os ativos em n grupos por hash estável do símbolo (crc32)."""
+    shards = [[] for _ in range(n)]
+    for asset in assets:
+        shards[zlib.crc32(asset.encode()) % n].append(asset)
+    return shards
+
+def _worker_main(shard, assets, out_queue, heartbeat_interval, url=None):
+    """Processo de shard: conexão socket.io própria, só com os seus ativos."""
+    import data_ingest
+    data_ingest.persist_signals = False
+    data_ingest.notify_signals = False
+    logging.basicConfig(level=logging.INFO)
+
+    async def on_new_signal(sig):
+        out_queue.put(("signal", shard, sig))
+
+    async def heartbeat():
+        # se o loop travar, o heartbeat para e o supervisor reinicia o processo
+        while True:
+            out_queue.put(("heartbeat", shard, time.time()))
+            await asyncio.sleep(heartbeat_interval)
+
+    async def main():
+        beat = asyncio.ensure_future(heartbeat())
+        await asyncio.sleep(0)  # primeiro heartbeat antes da hidratação/conexão
+        try:
+            await data_ingest.connect_and_listen(on_new_signal, url=url, assets=assets)
+        finally:
+            beat.cancel()
+
+    asyncio.run(main())
+
+class Shard:
+    def __init__(self, shard_id, assets):
+        self.id = shard_id
+        self.assets = assets
+        self.process = None
+        self.last_heartbeat = 0.0
+        self.started_at = 0.0
+        self.restarts = 0
+
+class IngestSupervisor:
+    """
+    Sobe um processo de ingestão por partição de ativos e recebe de volta os
+    sinais por uma multiprocessing.Queue. `on_signal` é chamado numa thread do
+    supervisor com loop asyncio próprio (dá para chamar notify_if_needed ali).
+    Shards mortos ou sem heartbeat por HEARTBEAT_TIMEOUT são reiniciados.
+    """
+
+    MAX_RESTART_DELAY = 60  # segundos entre tentativas para um shard que cai em seguida
+
+    def __init__(self, on_signal, assets=MONITORED_ASSETS, workers=INGEST_WORKERS,
+                 heartbeat_interval=HEARTBEAT_INTERVAL, heartbeat_timeout=HEARTBEAT_TIMEOUT, url=None):
+        self.on_signal = on_signal
+        self.url = url
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self._ctx = mp.get_context("spawn")
+        self._queue = self._ctx.Queue()
+        self.shards = [Shard(i, part) for i, part in enumerate(partition_assets(assets, workers)) if part]
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return False
+        self._stopping.clear()
+        for shard in self.shards:
+            self._spawn(shard)
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._receive()), name="ingest-supervisor", daemon=True)
+        self._thread.start()
+        return True
+
+    def is_running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def _spawn(self, shard):
+        shard.process = self._ctx.Process(target=_worker_main, name=f"ingest-shard-{shard.id}",
+                                          args=(shard.id, shard.assets, self._queue, self.heartbeat_interval, self.url),
+                                          daemon=True)
+        shard.process.start()
+        shard.started_at = shard.last_heartbeat = time.time()
+        LOG.info(f"Shard {shard.id} started (pid {shard.process.pid}): {shard.assets}")
+
+    async def _receive(self):
+        loop = asyncio.get_running_loop()
+        next_check = time.time() + self.heartbeat_interval
+        while not self._stopping.is_set():
+            try:
+                kind, shard_id, payload = await loop.run_in_executor(None, self._queue.get, True, 0.5)
+            except queue.Empty:
+                kind = None
+            if kind == "heartbeat":
+                self.shards_by_id[shard_id].last_heartbeat = payload
+            elif kind == "signal":
+                try:
+                    res = self.on_signal(payload)
+                    if asyncio.iscoroutine(res):
+                        await res
+                except Exception:
+                    LOG.exception("on_signal failed")
+            if time.time() >= next_check:
+                self.check_health()
+                next_check = time.time() + self.heartbeat_interval
+
+    @property
+    def shards_by_id(self):
+        return {s.id: s for s in self.shards}
+
+    def check_health(self):
+        now = time.time()
+        for shard in self.shards:
+            alive = shard.process is not None and shard.process.is_alive()
+            stale = now - shard.last_heartbeat > self.heartbeat_timeout
+            if alive and not stale:
+                continue
+            # backoff exponencial para shards que morrem logo após subir (feed fora do ar etc.)
+            if now - shard.started_at < min(2 ** shard.restarts, self.MAX_RESTART_DELAY):
+                continue
+            LOG.warning(f"Shard {shard.id} {'unresponsive' if alive else 'died'}, restarting")
+            if alive:
+                shard.process.terminate()
+                shard.process.join(5)
+            shard.restarts += 1
+            self._spawn(shard)
+
+    def status(self):
+        now = time.time()
+        return [{"shard": s.id, "assets": s.assets, "pid": s.process.pid if s.process else None,
+                 "alive": bool(s.process and s.process.is_alive()),
+                 "heartbeat_age_s": round(now - s.last_heartbeat, 1), "restarts": s.restarts}
+                for s in self.shards]
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        for shard in self.shards:
+            if shard.process and shard.process.is_alive():
+                shard.process.terminate()
+        for shard in self.shards:
+            if shard.process:
+                shard.process.join(timeout)
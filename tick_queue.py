@@ -0,0 +1,77 @@
+# tick_queue.py — fila limitada de ticks por ativo entre o socket.io e o processamento
+import asyncio
+import time
+from collections import deque
+from aggregator import MINUTE_MS
+
+POLICIES = ("coalesce", "drop")
+
+class TickQueue:
+    """
+    Ticks pendentes de um ativo. Cada item é um pedaço de minuto no formato de
+    MinuteAggregator.bars: [minuto, o, h, l, c, n_ticks, ts_open, ts_close, t_enfileirado].
+
+    Políticas quando o processamento está atrás (fila não vazia):
+    - "coalesce": o tick é fundido no último item se for do mesmo minuto
+      (OHLC e contagem preservados; o candle final é o mesmo); só uma virada de
+      minuto cria item novo, então a fila cresce por minuto e não por tick.
+      Cheia mesmo assim, o tick é descartado.
+    - "drop": um item por tick; cheia, o tick é descartado.
+
+    Não há política que espere espaço: o engineio despacha cada mensagem numa
+    task própria, então esperar na fila não freia o leitor, só acumula ticks
+    (sem limite e sem ordem garantida) nas corrotinas paradas.
+    """
+
+    def __init__(self, maxsize=1000, policy="coalesce"):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown tick queue policy: {policy} (expected one of {', '.join(POLICIES)})")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.items = deque()
+        self.dropped = 0
+        self.coalesced = 0
+        self.busy = False  # marcado pelo consumidor enquanto processa o que pegou em get_all
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self.items)
+
+    def lag(self):
+        """Segundos que o item mais antigo está esperando (0 com a fila vazia)."""
+        return time.monotonic() - self.items[0][8] if self.items else 0.0
+
+    async def put(self, ts_ms, price):
+        """Enfileira um tick; retorna False se ele foi descartado."""
+        minute = int(ts_ms // MINUTE_MS)
+        items = self.items
+        if self.policy == "coalesce" and items and items[-1][0] == minute:
+            bar = items[-1]
+            if price > bar[2]:
+                bar[2] = price
+            if price < bar[3]:
+                bar[3] = price
+            if ts_ms < bar[6]:
+                bar[1] = price
+                bar[6] = ts_ms
+            if ts_ms >= bar[7]:
+                bar[4] = price
+                bar[7] = ts_ms
+            bar[5] += 1
+            self.coalesced += 1
+            return True
+        if len(items) >= self.maxsize:
+            self.dropped += 1
+            return False
+        items.append([minute, price, price, price, price, 1, ts_ms, ts_ms, time.monotonic()])
+        self._ready.set()
+        return True
+
+    async def get_all(self):
+        """Espera haver itens e devolve todos de uma vez (em ordem de chegada)."""
+        while not self.items:
+            self._ready.clear()
+            await self._ready.wait()
+        items = list(self.items)
+        self.items.clear()
+        return items
@@ -0,0 +1,102 @@
+# warm_start.py — histórico recente de candles para reidratar os buffers na partida
+import logging
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy import text, bindparam
+from db import engine
+from candle_ring import CANDLE_DTYPE
+
+LOG = logging.getLogger("warm_start")
+LOG.setLevel(logging.INFO)
+
+# Últimas :n barras por (ativo, timeframe) de candles (1m) e candles_tf, numa consulta só.
+# O filtro por ativo usa os índices únicos (ativo, timestamp) / (ativo, timeframe, timestamp).
+_LAST_BARS_SQL = text("""
+SELECT ativo, timeframe, timestamp, o, h, l, c, v FROM (
+    SELECT ativo, '1m' AS timeframe, timestamp, o, h, l, c, v,
+           ROW_NUMBER() OVER (PARTITION BY ativo ORDER BY timestamp DESC) AS rn
+    FROM candles WHERE ativo IN :assets
+    UNION ALL
+    SELECT ativo, timeframe, timestamp, o, h, l, c, v,
+           ROW_NUMBER() OVER (PARTITION BY ativo, timeframe ORDER BY timestamp DESC) AS rn
+    FROM candles_tf WHERE ativo IN :assets AND timeframe IN :timeframes
+) WHERE rn <= :n
+ORDER BY ativo, timeframe, timestamp
+""").bindparams(bindparam("assets", expanding=True), bindparam("timeframes", expanding=True))
+
+def _to_bars(df):
+    bars = np.zeros(len(df), dtype=CANDLE_DTYPE)
+    ts = pd.to_datetime(df["timestamp"], format="ISO8601")
+    if ts.dt.tz is not None:
+        ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+    bars["timestamp"] = ts.dt.as_unit("ns").to_numpy().view("int64")
+    for col in ("o", "h", "l", "c", "v"):
+        bars[col] = df[col].to_numpy(dtype=np.float64, na_value=0.0)
+    return bars
+
+def load_from_db(assets, n, timeframes=()):
+    """{(ativo, tf): array CANDLE_DTYPE} com as últimas n barras de cada ativo/timeframe."""
+    assets = list(assets)
+    if not assets:
+        return {}
+    params = {"assets": assets, "timeframes": list(timeframes) or [""], "n": n}
+    with engine.connect() as conn:
+        df = pd.read_sql(_LAST_BARS_SQL, conn, params=params)
+    return {key: _to_bars(part) for key, part in df.groupby(["ativo", "timeframe"], sort=False)}
+
+def snapshot_file(root, asset, tf="1m"):
+    return os.path.join(root, f"{asset}_{tf}.npy")
+
+def write_snapshot(root, bars_by_key):
+    """Grava {(ativo, tf): array CANDLE_DTYPE} em <root>/<ativo>_<tf>.npy (troca atômica por arquivo)."""
+    os.makedirs(root, exist_ok=True)
+    for (asset, tf), bars in bars_by_key.items():
+        path = snapshot_file(root, asset, tf)
+        tmp = path + ".tmp.npy"
+        np.save(tmp, bars)
+        os.replace(tmp, path)
+
+def load_snapshot(root, assets, timeframes=()):
+    out = {}
+    if not root or not os.path.isdir(root):
+        return out
+    for asset in assets:
+        for tf in ["1m", *timeframes]:
+            path = snapshot_file(root, asset, tf)
+            if not os.path.exists(path):
+                continue
+            try:
+                bars = np.load(path)
+            except Exception:
+                LOG.exception(f"Ignoring unreadable snapshot {path}")
+                continue
+            if bars.dtype == CANDLE_DTYPE:
+                out[(asset, tf)] = bars
+    return out
+
+def merge_bars(older, newer, n):
+    """Junta dois históricos pelo timestamp (o `newer` vence) e fica com as últimas n barras."""
+    if older is None or not len(older):
+        return newer[-n:]
+    if newer is None or not len(newer):
+        return older[-n:]
+    bars = np.concatenate([newer, older])
+    _, first = np.unique(bars["timestamp"], return_index=True)  # ordenado; índice da 1ª ocorrência = newer
+    return bars[first][-n:]
+
+def load_history(assets, n, timeframes=(), snapshot_dir=None):
+    """
+    Últimas n barras por (ativo, tf) para a partida: o banco é a fonte principal
+    e o snapshot em disco completa o que ainda não tinha sido gravado (ou o
+    banco inteiro, se ele estiver vazio/indisponível).
+    """
+    history = load_snapshot(snapshot_dir, assets, timeframes) if snapshot_dir else {}
+    try:
+        from_db = load_from_db(assets, n, timeframes)
+    except Exception:
+        LOG.exception("Could not load candle history from the DB")
+        from_db = {}
+    for key, bars in from_db.items():
+        history[key] = merge_bars(history.get(key), bars, n)
+    return {key: bars[-n:] for key, bars in history.items() if len(bars)}